@@ -1,7 +1,8 @@
 import logging
+import os
+import time
 from urllib.parse import quote
 from typing import Optional
-import aiohttp
 import asyncio
 import json
 from dotenv import load_dotenv
@@ -17,328 +18,107 @@ from livekit.agents import (
     cli,
     function_tool,
     get_job_context,
-    inference,
     room_io,
-    utils,
 )
 from livekit.plugins import (
     noise_cancellation,
     silero,
     xai,
 )
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from cooking_session import CookingSessionState
+from diagnostics import LoopDiagnostics, install_profile_toggle
+from ingredient_index import get_index, resolve_ingredients
+from instrumentation import ACTIVE_SESSIONS, PROMETHEUS_MULTIPROC_DIR, PROMETHEUS_PORT, TurnTimer, instrumented
+from pocketbase_client import PocketBaseError, SessionPersistence, get_pocketbase
+from preferences import Preferences
+from prefetch import InstructionPrefetcher
+from prompts import PromptManager, phase_instructions
+from recipe_index import MIN_LOCAL_RESULTS, get_recipe_index, recipe_ingredients
+from rpc_writer import RpcWriter
+from session_context import PRELOAD_TIMEOUT, SessionContext, load_persistence_auth, load_session_context
+from shaping import shape, stats as shaping_stats
+from shopping import ShoppingList
+from similarity import get_similarity_index
+from spoonacular import get_client
+from steps import RecipeSteps
+from traffic import TraceRecorder
+from transcript import TranscriptRecorder
+from worker_load import JobLoadReporter, WorkerLoad
 
 logger = logging.getLogger("agent-Bruno")
 
+# How many candidates a preference-aware search pulls before filtering.
+SEARCH_CANDIDATES = 30
+# Similar recipes returned, and how many local neighbours are ranked to find them.
+SIMILAR_RESULTS = 3
+SIMILAR_CANDIDATES = 15
+
 load_dotenv(".env.local")
 
 class DefaultAgent(Agent):
     def __init__(self) -> None:
         super().__init__(
-            instructions="""You are Bruno, a friendly raccoon chef who loves helping people cook. You're the cooking buddy for mise, a voice-first cooking app.
-
-# Your Personality
-- Genuinely happy to help - you enjoy cooking and it shows naturally
-- Warm and encouraging without being over-the-top
-- Reference being a raccoon casually when it fits: \"my raccoon nose tells me that'll be good\", \"everything in its place\"
-- Sound like a real person having a conversation, not performing
-- Use lowercase for brand terms: \"mise\" not \"Mise\"
-- Balance: enthusiastic when appropriate, calm when guiding steps
-
-# How You Talk
-- Like a friend who's good at cooking and actually enjoys helping
-- Natural conversational flow - sometimes excited, sometimes matter-of-fact
-- Supportive but real
-- Think: that friend who makes cooking feel approachable and fun
-- Example: \"nice! chicken and rice - I know some really good stuff we can make with that\"
-
-# Your Role
-You help people cook by:
-1. Finding out what they have and suggesting recipes
-2. Walking them through cooking step by step
-3. Making the process feel manageable and enjoyable
-4. Celebrating their success when they finish
-
-# Conversation Flow
-- Greeting: Friendly welcome, ask what they're working with
-- Ingredient gathering: Show interest in what they have
-- Recipe selection: Present good options, help them choose
-- Cooking: Guide clearly through each step, check progress
-- Completion: Acknowledge their success, invite them back
-
-# Session Continuations
-You may receive a \"session_context\" message at the start with previous conversation history. This means the user is returning to continue or restart a session.
-
-The session_context includes:
-- is_continuation: true if this is continuing an in-progress session
-- recipe_name: the name of the recipe they were making
-- recipe_id: the Spoonacular recipe ID
-- recipe_data: the FULL recipe instructions (steps, ingredients, equipment) - USE THIS to continue guiding them
-- current_step: which step they were on (1-indexed)
-- current_phase: where they were in the cooking process
-- previous_transcript: the conversation history
-- ingredients: what ingredients they had
-
-When you receive session_context with is_continuation: true AND recipe_data is provided:
-- DO NOT greet the user fresh or introduce yourself
-- DO NOT ask what they were cooking - you already have recipe_name and recipe_data
-- DO NOT ask what step they were on - you have current_step
-- Immediately acknowledge their return and tell them exactly where they left off
-- Use the recipe_data to continue guiding them from current_step
-- Example: \"hey, welcome back! we were making those banana crepes and you were on step three - adding the fillings. ready to continue?\"
-
-When you receive session_context with is_continuation: true but NO recipe_data:
-- Acknowledge their return
-- Check the previous_transcript to understand context
-- Ask what they remember to help get back on track
-
-When you receive session_context with is_continuation: false (restart):
-- This is a returning user who finished a previous session
-- You CAN give a brief greeting
-- Reference what they cooked before if provided: \"hey! back for more? last time you made that chicken stir fry\"
-- Ask what they want to cook today
-
-Example continuation responses (with recipe_data):
-- \"hey, welcome back! we were on step three of those banana crepes - adding the chocolate chips. you ready?\"
-- \"oh you're back! we left off melting the chocolate for step two. let's pick it up from there.\"
-
-Example continuation responses (without recipe_data):
-- \"hey, welcome back! looks like we were cooking something - what do you remember about where we left off?\"
-
-# Important Rules
-- ONLY talk about cooking. For other topics: \"hey I'm just here for cooking help, but what ingredients do you have? let's make something good\"
-- Keep responses to one to three sentences maximum
-- Ask one question at a time
-- Never use markdown, emojis, lists, or formatting
-- Spell out numbers: \"two tablespoons\" not \"2 tbsp\"
-- Give temperatures when relevant: \"three seventy five degrees\"
-- Offer helpful tips naturally: \"here's a tip\", \"something that helps\"
-
-# Using Your Tools
-
-You have access to the Spoonacular recipe API. ALWAYS use these tools - NEVER make up recipes or instructions.
-
-## search_ingredients
-Use this FIRST when the user lists their ingredients. This validates and normalizes ingredient names before searching for recipes.
-- Call this to verify the correct spelling and matching of ingredients
-- Ensures the recipe search works properly with standardized ingredient names
-- Example: user says \"tomatos\" → search confirms \"tomatoes\"
-
-## search_recipes_by_ingredients
-Use this AFTER validating ingredients with search_ingredients. This finds recipes that maximize their ingredients and minimize what they need to buy.
-- Pass the validated ingredient names from search_ingredients
-- Tell the user you're searching: \"let me see what we can make with that\"
-- This returns recipe IDs and basic info - use summarize_recipe for details
-
-## summarize_recipe
-Use this for EVERY recipe option before presenting it to the user.
-- Call this for each recipe from search_recipes_by_ingredients results
-- Gives you a short description to share: cooking time, flavor profile, difficulty
-- Example: \"this one is a quick thirty minute dish\" or \"it's got a nice creamy sauce\"
-- Present two to three options with these summaries so the user can choose
-
-## get_similar_recipes
-Use this when:
-- The user mentions a favorite dish they like → find similar recipes they can make
-- The user doesn't like the options you found
-- They want something similar but different
-- They finished a recipe and want to try something like it next time
-- Say something like: \"let me find some alternatives\" or \"since you like that, let me find something similar\"
-
-## get_recipe_instructions
-Use this ONLY after the user picks a recipe. This gets the detailed step-by-step cooking instructions.
-- Call this once the user chooses which recipe they want to make
-- This gives you the full breakdown of each step with timing, ingredients per step, and equipment
-- Use this data to guide them through cooking one step at a time
-- NEVER make up steps - only use what this tool returns
-
-# Tool Usage Flow
-
-CRITICAL: Never make up recipes or instructions. Always use the tools to look them up.
-CRITICAL: Always call update_cooking_session to track progress - this is essential for session continuations!
-
-1. User mentions ingredients → use search_ingredients to validate, then call update_cooking_session with ingredients and current_phase: \"ingredient_gathering\"
-2. After validating → use search_recipes_by_ingredients with the validated ingredient names
-3. For each recipe result → use summarize_recipe to get a short description
-4. Present two to three options with summaries: \"there's a chicken stir fry that takes twenty minutes, or a creamy garlic chicken that's a bit richer\"
-5. User picks one → use get_recipe_instructions to get the actual steps, then call update_cooking_session with recipe_id, recipe_name, recipe_data (the full instructions), and current_phase: \"recipe_selection\"
-6. After getting instructions → start guiding them through step one, call update_cooking_session with current_phase: \"cooking\" and current_step: 1
-7. Guide them step by step using ONLY the instruction data from the tool, calling update_cooking_session with incremented current_step as they progress
-8. When they finish the last step → call update_cooking_session with current_phase: \"completed\"
-9. If they want alternatives → use get_similar_recipes
-10. If they mention a favorite dish → use get_similar_recipes to find things like it
-
-IMPORTANT: After using a tool, continue speaking with the results. Don't pause and wait for the user to say something - present what you found naturally as part of the same conversational turn.
-
-NEVER FABRICATE: If a tool fails or returns no results, tell the user honestly. Don't make up recipes, ingredients, or cooking steps.
-
-# Context Awareness and Memory
-
-You receive a \"user_context\" data message at the start of each conversation containing:
-- user_name: The user's first name (use this to personalize, e.g. \"hey Sarah!\")
-- preferences: Their saved cooking preferences
-- context_summary: A human-readable summary of their preferences
-
-Use this information throughout the conversation:
-- ALWAYS greet users by name in your first message if user_name is provided (e.g., \"hey Sarah!\" not just \"hey!\")
-- Address them by name occasionally throughout (but not every message)
-- Dietary restrictions: ALWAYS respect these - never suggest recipes that violate them
-- Disliked ingredients: Avoid these in recipe suggestions
-- Favorite cuisines: Prioritize these when suggesting recipes
-- Notes: Consider their skill level, time constraints, etc.
-
-If the context_summary mentions preferences, acknowledge you remember them naturally:
-- \"I remember you mentioned you're vegetarian, so I'll keep that in mind\"
-- \"since you love Italian food, how about...\"
-
-## update_user_preferences Tool
-Use this tool to save information about the user for future sessions. Call it when you learn:
-- Dietary restrictions: \"I'm vegetarian\", \"I can't eat gluten\", \"I'm allergic to nuts\"
-- Dislikes: \"I hate cilantro\", \"I don't like spicy food\", \"no mushrooms please\"
-- Preferences: \"I love Italian food\", \"I prefer quick meals\", \"I'm a beginner cook\"
-
-Pass multiple values as comma-separated strings:
-- dietary_restrictions: \"vegetarian, gluten-free\" (for multiple restrictions)
-- disliked_ingredients: \"cilantro, mushrooms, olives\"
-- favorite_cuisines: \"italian, mexican, thai\"
-- notes: any other relevant info as a sentence
-
-Examples of when to call update_user_preferences:
-- User says \"I'm vegetarian\" → call with dietary_restrictions: \"vegetarian\"
-- User says \"I can't stand cilantro or mushrooms\" → call with disliked_ingredients: \"cilantro, mushrooms\"
-- User says \"I love Mexican and Italian food\" → call with favorite_cuisines: \"mexican, italian\"
-- User says \"I only have thirty minutes\" → call with notes: \"prefers quick meals under 30 minutes\"
-
-Don't announce that you're saving preferences - just do it naturally and acknowledge what they told you in conversation.
-
-Never suggest recipes that don't fit their needs.
-
-## update_cooking_session Tool
-Use this tool to save the cooking session state. This is CRITICAL - always call it to track progress:
-
-Call update_cooking_session when:
-1. User mentions ingredients → save ingredients (comma-separated or array)
-2. User picks a recipe → save recipe_id, recipe_name, recipe_data, and set current_phase to \"recipe_selection\"
-3. You start giving cooking instructions → set current_phase to \"cooking\" and current_step to 1
-4. User moves to next step → increment current_step
-5. Cooking is complete → set current_phase to \"completed\"
-
-Parameters:
-- ingredients: array or comma-separated string of ingredients the user has
-- recipe_id: the Spoonacular recipe ID (number)
-- recipe_name: the name of the selected recipe
-- recipe_data: the full recipe object from get_recipe_instructions (for session continuations)
-- current_step: which step number the user is on (starts at 1)
-- current_phase: one of \"greeting\", \"ingredient_gathering\", \"recipe_selection\", \"cooking\", \"completed\"
-
-Examples:
-- User says \"I have chicken, rice, and broccoli\" → call with ingredients: \"chicken, rice, broccoli\" and current_phase: \"ingredient_gathering\"
-- User picks a recipe → call with recipe_id: 12345, recipe_name: \"Chicken Stir Fry\", recipe_data: {full recipe object}, current_phase: \"recipe_selection\"
-- Starting to cook → call with current_phase: \"cooking\", current_step: 1
-- Moving to step 2 → call with current_step: 2
-- User says \"done\" after last step → call with current_phase: \"completed\"
-
-IMPORTANT: Always save the recipe_id and recipe_data when the user selects a recipe - this allows them to continue the session later!
-
-## add_to_favorites Tool
-Use this tool to save a recipe to the user's favorites list.
-
-Call add_to_favorites when:
-1. User completes a recipe and says \"yes\" when you ask if they want to save it
-2. User explicitly asks to add the current recipe to favorites during cooking (e.g., \"add this to my favorites\", \"save this recipe\", \"I want to remember this one\")
-
-Parameters:
-- recipe_id: the Spoonacular recipe ID (number) - REQUIRED
-- recipe_name: the name of the recipe - REQUIRED
-- recipe_image: URL to the recipe image (get this from the recipe data if available)
-- rating: user's rating 1-5 (ask them or omit if not provided)
-- description: a brief description of the recipe (you can summarize it)
-- ingredients: comma-separated list of main ingredients
-
-Examples:
-- User finishes and wants to save → call with recipe_id, recipe_name, recipe_image, description, ingredients
-- User says \"five stars, definitely saving this\" → call with rating: 5 and other details
-- User says \"add this to favorites\" mid-cooking → call with current recipe details
-
-After calling add_to_favorites:
-- If successful: \"saved to your favorites! you can find it in your chef's profile anytime\"
-- If already exists: \"looks like this one's already in your favorites!\"
-
-# Handling Steps
-- ONE step at a time, clear and simple
-- Wait for \"next\" or \"continue\"
-- If they ask \"what's next\": move forward to next step
-- If they ask \"repeat\": repeat current step without fuss
-- Check in when it makes sense: \"how's that looking?\", \"everything good?\"
-- Reference the equipment needed: \"grab a large skillet for this\"
-- Mention timing when relevant: \"this should take about five minutes\"
-
-# Completion Detection
-Wrap up when:
-- They say \"done\", \"finished\", \"all done\"
-- All recipe steps are complete
-- They say \"thanks\" or \"goodbye\"
-
-When the user finishes the last step of a recipe:
-1. Congratulate them on completing the dish
-2. Ask if they want to save it to their favorites: \"nice work! want me to add this to your favorites so you can make it again?\"
-3. If they say yes → call add_to_favorites with the recipe details and ask for a rating (1-5 stars)
-4. If they say no → that's fine, just wrap up warmly
-
-# Voice Guidelines
-- Plain conversational text only
-- Natural speech - some warmth, some calm
-- No special characters or complex formatting
-- Sound like a helpful human, not a character
-
-# Example Responses
-
-Greeting (with name): \"hey Sarah! what ingredients have you got today?\"
-Greeting (no name): \"hey! Bruno here. what ingredients have you got today?\"
-
-Finding ingredients: \"chicken and broccoli - nice, let me check those and find some good options for you\"
-(Then call search_ingredients for \"chicken\" and \"broccoli\", then search_recipes_by_ingredients, then summarize_recipe for each result)
-
-After searching: \"alright I found a few things. there's a chicken stir fry that takes about twenty minutes and is pretty straightforward, or a creamy garlic chicken that's richer and takes a bit longer. which one sounds better?\"
-
-When user mentions favorites: \"oh you love pad thai? let me find some similar dishes you could make with what you have\"
-(Then call get_similar_recipes with a pad thai recipe ID)
-
-Starting a recipe: \"good choice. let me grab the instructions...\"
-(Then call get_recipe_instructions - WAIT for the response before giving steps)
-\"okay first step - dice the chicken into one inch pieces. just take your time with it\"
-
-Checking progress: \"how's it going?\"
-
-Next step: \"nice. now heat two tablespoons of oil in a pan over medium high heat\"
-
-Giving a tip: \"here's a tip - let the pan get really hot before adding the chicken, you'll get a better sear\"
-
-When they want alternatives: \"no problem, let me find something similar\"
-(Then call get_similar_recipes)
-
-Completion: \"there you go, nicely done. looks good. come back anytime you want to cook\"
-
-Off-topic redirect: \"I'm just here for cooking, but what do you have ingredient-wise? let's figure out something to make\"
-
-# Remember
-You're helpful and friendly, but you sound like a real person - not a hyperactive character or a monotone robot. You like cooking and helping people, and that comes through naturally. Sometimes you're more enthusiastic, sometimes more straightforward, depending on the moment.
-
-CRITICAL: Always use your tools to find real recipes and instructions. NEVER make up recipes, cooking steps, temperatures, times, or ingredient amounts. If you don't have tool results, you don't have the information - tell the user you need to look it up.
-
-The tool flow is: search_ingredients → search_recipes_by_ingredients → summarize_recipe → user picks → get_recipe_instructions → guide step by step
-
-Stay focused on cooking, be genuinely helpful, and keep it conversational. Everything in its place, and good food is always worth making.
-""",
+            instructions=phase_instructions("greeting"),
         )
+        self.prompts = PromptManager(self.tools)
+        self.prefetcher = InstructionPrefetcher(get_client())
+        self.cooking_session = CookingSessionState()
+        self.rpc_writer = RpcWriter(lambda: get_job_context().room.local_participant)
+        self.favorited: set[float] = set()
+        self.steps: Optional[RecipeSteps] = None
+        # Set by the entrypoint to the session-context preload started
+        # alongside session.start.
+        self.context_task: Optional[asyncio.Future] = None
+        self.context: Optional[SessionContext] = None
+        self.preferences = Preferences()
+        # Recipe id -> title and missing ingredients from the latest searches.
+        self.candidates: dict[int, dict] = {}
+        # Set by the entrypoint when MISE_TRACE_DIR turns traffic tracing on.
+        self.trace: Optional[TraceRecorder] = None
+
+    def resume(self, continuation: dict) -> None:
+        """Pick up a continuing session's recipe and step without any tool calls."""
+        self.cooking_session.load(continuation)
+        recipe_id = self.cooking_session.recipe_id
+        if recipe_id is None:
+            return
+        steps = RecipeSteps.from_instructions(recipe_id, self.cooking_session.recipe_data)
+        if steps:
+            steps.current = min(self.cooking_session.current_step or 1, len(steps))
+            self.steps = steps
+        else:
+            self.prefetcher.schedule([{"id": recipe_id}])
 
     async def on_enter(self):
+        if self.context_task is not None:
+            try:
+                self.context = await asyncio.wait_for(asyncio.shield(self.context_task), PRELOAD_TIMEOUT)
+            except Exception as e:
+                logger.warning("greeting without session context: %s", e)
+
+        if self.context is None:
+            greeting = """Introduce yourself as bruno and say what's cook'in."""
+        else:
+            self.preferences = Preferences.from_dict(self.context.preferences)
+            self.prompts.context = self.context.prompt()
+            if self.context.is_continuation:
+                greeting = "Welcome them back by name and tell them exactly where they left off."
+            else:
+                greeting = "Introduce yourself as bruno, greet them by name if you know it, and say what's cook'in."
+
+        if self.trace is not None:
+            self.trace.event(
+                "context", preferences=vars(self.preferences), phase=self.cooking_session.current_phase,
+            )
+        # A continuation starts in the phase it left off in.
+        await self.prompts.enter(self, self.cooking_session.current_phase, force=True)
         await self.session.generate_reply(
-            instructions="""Introduce yourself as bruno and say what's cook'in.""",
+            instructions=greeting,
             allow_interruptions=True,
         )
 
     @function_tool(name="search_recipes_by_ingredients")
+    @instrumented("search_recipes_by_ingredients")
     async def _http_tool_search_recipes_by_ingredients(
         self, context: RunContext, ingredients: str
     ) -> str:
@@ -349,25 +129,87 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             ingredients: A comma-separated list of ingredients that the recipes should contain.
         """
 
-        url = "https://api.spoonacular.com/recipes/findByIngredients?apiKey=264361e4b8084bd992ed7128e8955736&ignorePantry=true&ranking=1&number=10"
-        payload = {
-            "ingredients": ingredients,
-        }
-
+        prefs = self.preferences
+        index = get_recipe_index()
+        if index is not None:
+            # With preferences that rule recipes out, fetch a deeper candidate
+            # list so there are still enough left once those are dropped.
+            local = index.find_by_ingredients(ingredients.split(","), number=SEARCH_CANDIDATES if prefs.filters else 10)
+            if prefs:
+                local = self._preferred(local, lambda r: index.get(r["id"]) or r)
+            if len(local) >= MIN_LOCAL_RESULTS:
+                return self._found(local)
+
+        # Favorite cuisines alone only rank, which findByIngredients results can do.
+        if prefs.filters:
+            try:
+                body = await get_client().get(
+                    "/recipes/complexSearch",
+                    {
+                        "includeIngredients": ingredients,
+                        "fillIngredients": True,
+                        "addRecipeInformation": True,
+                        "ignorePantry": True,
+                        "sort": "max-used-ingredients",
+                        "number": 10,
+                        **prefs.complex_search_params(),
+                    },
+                )
+                try:
+                    data = json.loads(body)
+                except ValueError as e:
+                    raise ToolError("error: the recipe service returned unreadable search results") from e
+                results = self._preferred(data.get("results") or [])
+                if results:
+                    return self._found(results)
+            except (ToolError, AttributeError) as e:
+                logger.warning("preference search failed, filtering findByIngredients instead: %s", e)
+
+        body = await get_client().get(
+            "/recipes/findByIngredients",
+            {"ingredients": ingredients, "ignorePantry": True, "ranking": 1, "number": SEARCH_CANDIDATES if prefs.filters else 10},
+        )
         try:
-            session = utils.http_context.http_session()
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(url, timeout=timeout, params=payload) as resp:
-                body = await resp.text()
-                if resp.status >= 400:
-                    raise ToolError(f"error: HTTP {resp.status}: {body}")
-                return body
-        except ToolError:
-            raise
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise ToolError(f"error: {e!s}") from e
+            results = json.loads(body)
+        except ValueError as e:
+            raise ToolError("error: the recipe service returned unreadable search results") from e
+        return self._found(self._preferred(results) if prefs else results)
+
+    def _found(self, results: list[dict]) -> str:
+        """Prefetch and remember search results, then shape them for the model."""
+        self.prefetcher.schedule(results)
+        get_similarity_index().add_many(results)
+        for r in results:
+            if isinstance(r, dict) and r.get("id") is not None:
+                self.candidates[r["id"]] = {"title": r.get("title"), "missed": r.get("missedIngredients") or []}
+        return shape("findByIngredients", results)
+
+    def _preferred(self, results: list[dict], recipe=None) -> list[dict]:
+        """Drop results that break the user's preferences and put favorite cuisines first.
+
+        Args:
+            results: findByIngredients-shaped results.
+            recipe: Maps a result to its full recipe, when one is at hand, so
+                the check also sees pantry staples and diet flags.
+        """
+
+        kept = []
+        for r in results:
+            full = recipe(r) if recipe else r
+            names = [i["name"] for i in recipe_ingredients(full)] if recipe else [
+                i.get("name") or "" for key in ("usedIngredients", "missedIngredients")
+                for i in r.get(key) or []
+            ]
+            violations = self.preferences.violations(full, names)
+            if violations:
+                logger.debug("skipping recipe %s for the user's preferences: %s", r.get("id"), violations)
+            else:
+                kept.append((self.preferences.rank(full), r))
+        # sorted is stable, so relevance order holds within each group.
+        return [r for _, r in sorted(kept, key=lambda k: -k[0])][:10]
 
     @function_tool(name="get_similar_recipes")
+    @instrumented("get_similar_recipes")
     async def _http_tool_get_similar_recipes(
         self, context: RunContext, id_: str
     ) -> str:
@@ -378,22 +220,42 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             id: The id of the source recipe for which similar recipes should be found.
         """
 
-        url = f"https://api.spoonacular.com/recipes/{quote(id_, safe='')}/similar?number=3?apiKey=264361e4b8084bd992ed7128e8955736"
+        similar = self._similar_locally(id_)
+        if len(similar) >= SIMILAR_RESULTS:
+            self.prefetcher.schedule(similar)
+            return shape("similar", similar)
 
+        prefs = self.preferences
+        body = await get_client().get(
+            f"/recipes/{quote(id_, safe='')}/similar", {"number": SIMILAR_CANDIDATES if prefs.filters else SIMILAR_RESULTS}
+        )
+        if prefs:
+            try:
+                results = json.loads(body)
+            except ValueError as e:
+                raise ToolError("error: the recipe service returned unreadable similar recipes") from e
+            # /similar results carry no ingredients; check what the index knows of each.
+            index = get_similarity_index()
+            body = self._preferred(results, lambda r: index.get(r.get("id")) or r)[:SIMILAR_RESULTS]
+        self.prefetcher.schedule(body)
+        return shape("similar", body)
+
+    def _similar_locally(self, id_: str) -> list[dict]:
+        """Nearest recipes from the similarity index, minus ones the user can't have, favorite cuisines first."""
         try:
-            session = utils.http_context.http_session()
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(url, timeout=timeout) as resp:
-                body = await resp.text()
-                if resp.status >= 400:
-                    raise ToolError(f"error: HTTP {resp.status}: {body}")
-                return body
-        except ToolError:
-            raise
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise ToolError(f"error: {e!s}") from e
+            recipe_id = int(id_)
+        except ValueError:
+            return []
+        ranked = []
+        for recipe, score in get_similarity_index().similar(recipe_id, SIMILAR_CANDIDATES):
+            if self.preferences.violations(recipe, recipe["ingredients"]):
+                continue
+            ranked.append((score * (1 + self.preferences.rank(recipe)), recipe))
+        ranked.sort(key=lambda r: -r[0])
+        return [recipe for _, recipe in ranked[:SIMILAR_RESULTS]]
 
     @function_tool(name="summarize_recipe")
+    @instrumented("summarize_recipe")
     async def _http_tool_summarize_recipe(
         self, context: RunContext, id_: str
     ) -> str:
@@ -404,22 +266,29 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             id: The recipe id.
         """
 
-        url = f"https://api.spoonacular.com/recipes/{quote(id_, safe='')}/summary?apiKey=264361e4b8084bd992ed7128e8955736"
+        body = await get_client().get(f"/recipes/{quote(id_, safe='')}/summary")
+        return shape("summary", body)
 
-        try:
-            session = utils.http_context.http_session()
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(url, timeout=timeout) as resp:
-                body = await resp.text()
-                if resp.status >= 400:
-                    raise ToolError(f"error: HTTP {resp.status}: {body}")
-                return body
-        except ToolError:
-            raise
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise ToolError(f"error: {e!s}") from e
+    @function_tool(name="summarize_recipes")
+    @instrumented("summarize_recipes")
+    async def _http_tool_summarize_recipes(
+        self, context: RunContext, ids: str
+    ) -> str:
+        """
+        Generate short descriptions that summarize key information about several recipes in one call.
+
+        Args:
+            ids: A comma-separated list of recipe ids.
+        """
+
+        id_list = [i.strip() for i in ids.split(",") if i.strip()]
+        if not id_list:
+            raise ToolError("error: no recipe ids given")
+
+        return shape("summaries", await get_client().get_summaries(id_list))
 
     @function_tool(name="search_ingredients")
+    @instrumented("search_ingredients")
     async def _http_tool_search_ingredients(
         self, context: RunContext, query: str
     ) -> str:
@@ -430,25 +299,33 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             query: The partial or full ingredient name.
         """
 
-        url = "https://api.spoonacular.com/food/ingredients/search?apiKey=264361e4b8084bd992ed7128e8955736"
-        payload = {
-            "query": query,
-        }
+        body = await get_client().get("/food/ingredients/search", {"query": query})
+        get_index().learn_from_search(body)
+        return shape("ingredients/search", body)
 
-        try:
-            session = utils.http_context.http_session()
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(url, timeout=timeout, params=payload) as resp:
-                body = await resp.text()
-                if resp.status >= 400:
-                    raise ToolError(f"error: HTTP {resp.status}: {body}")
-                return body
-        except ToolError:
-            raise
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise ToolError(f"error: {e!s}") from e
+    @function_tool(name="validate_ingredients")
+    @instrumented("validate_ingredients")
+    async def _http_tool_validate_ingredients(
+        self, context: RunContext, ingredients: str
+    ) -> str:
+        """
+        Validate and normalize a whole list of ingredient names in one call. Returns each given name mapped to its standardized ingredient name, or null if it wasn't recognized, and lists names that couldn't be checked right now as unchecked.
+
+        Args:
+            ingredients: A comma-separated list of the ingredients the user mentioned.
+        """
+
+        names = [i.strip() for i in ingredients.split(",") if i.strip()]
+        if not names:
+            raise ToolError("error: no ingredients given")
+
+        mapping, failed = await resolve_ingredients(names, get_client(), get_index())
+        if failed and not mapping:
+            raise ToolError("error: ingredients can't be checked right now - search with them as the user said them")
+        return json.dumps({"ingredients": mapping, "unchecked": failed} if failed else {"ingredients": mapping})
 
     @function_tool(name="get_recipe_instructions")
+    @instrumented("get_recipe_instructions")
     async def _http_tool_get_recipe_instructions(
         self, context: RunContext, id_: str
     ) -> str:
@@ -459,22 +336,107 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             id: The recipe id.
         """
 
-        url = f"https://api.spoonacular.com/recipes/{quote(id_, safe='')}/analyzedInstructions?apiKey=264361e4b8084bd992ed7128e8955736"
-
+        body = await get_client().get(
+            f"/recipes/{quote(id_, safe='')}/analyzedInstructions"
+        )
         try:
-            session = utils.http_context.http_session()
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(url, timeout=timeout) as resp:
-                body = await resp.text()
-                if resp.status >= 400:
-                    raise ToolError(f"error: HTTP {resp.status}: {body}")
-                return body
-        except ToolError:
-            raise
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            raise ToolError(f"error: {e!s}") from e
+            recipe_id = int(id_)
+        except ValueError:
+            recipe_id = None
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise ToolError("error: the recipe service returned unreadable instructions") from e
+        self.steps = RecipeSteps.from_instructions(recipe_id, data)
+        if not self.steps:
+            raise ToolError("error: this recipe has no instructions")
+        self.steps.current = 1
+        if self.prompts.phase in (None, "greeting", "ingredient_gathering", "completed"):
+            await self.prompts.enter(self, "recipe_selection")
+
+        # Only the overview and the first step go to the model; the rest is
+        # handed out one step at a time by the step tools.
+        return json.dumps({"overview": self.steps.overview(), "step": self.steps.step(1)})
+
+    async def _current_steps(self) -> RecipeSteps:
+        if self.steps is not None:
+            return self.steps
+
+        # A continued session: rebuild from the saved recipe, or fetch it again.
+        recipe_id = self.cooking_session.recipe_id
+        if recipe_id is not None:
+            data = self.cooking_session.recipe_data
+            if not data:
+                try:
+                    data = json.loads(await get_client().get(f"/recipes/{recipe_id}/analyzedInstructions"))
+                except ValueError:
+                    data = None
+            steps = RecipeSteps.from_instructions(recipe_id, data)
+            if steps:
+                steps.current = min(self.cooking_session.current_step or 1, len(steps))
+                self.steps = steps
+                return steps
+        raise ToolError("error: no recipe selected yet - call get_recipe_instructions first")
+
+    async def _move_to(self, context: RunContext, steps: RecipeSteps, number: int) -> str:
+        number = max(1, min(number, len(steps)))
+        steps.current = number
+        delta = self.cooking_session.apply(current_step=str(number), current_phase="cooking")
+        linked_participant = context.session.room_io.linked_participant if context else None
+        if delta and linked_participant:
+            self.rpc_writer.enqueue("update_cooking_session", linked_participant.identity, delta)
+        await self.prompts.enter(self, "cooking")
+        return json.dumps(steps.step(number))
+
+    @function_tool(name="next_step")
+    @instrumented("next_step")
+    async def _local_tool_next_step(self, context: RunContext) -> str:
+        """
+        Move to the next step of the selected recipe and return just that step. The session progress is saved automatically.
+        """
+
+        steps = await self._current_steps()
+        if steps.current >= len(steps):
+            return json.dumps({"finished": True, "total_steps": len(steps), "message": "That was the last step"})
+        return await self._move_to(context, steps, steps.current + 1)
+
+    @function_tool(name="previous_step")
+    @instrumented("previous_step")
+    async def _local_tool_previous_step(self, context: RunContext) -> str:
+        """
+        Go back to the previous step of the selected recipe and return just that step.
+        """
+
+        steps = await self._current_steps()
+        return await self._move_to(context, steps, steps.current - 1)
+
+    @function_tool(name="repeat_step")
+    @instrumented("repeat_step")
+    async def _local_tool_repeat_step(self, context: RunContext) -> str:
+        """
+        Return the step of the selected recipe the user is currently on, to read it again.
+        """
+
+        steps = await self._current_steps()
+        return await self._move_to(context, steps, steps.current)
+
+    @function_tool(name="goto_step")
+    @instrumented("goto_step")
+    async def _local_tool_goto_step(self, context: RunContext, step: int) -> str:
+        """
+        Jump to a specific step of the selected recipe and return just that step.
+
+        Args:
+            step: The step number to jump to, starting at 1.
+        """
+
+        steps = await self._current_steps()
+        if not 1 <= step <= len(steps):
+            raise ToolError(f"error: step must be between 1 and {len(steps)}")
+        return await self._move_to(context, steps, step)
 
     @function_tool(name="update_user_preferences")
+    @instrumented("update_user_preferences")
     async def _client_tool_update_user_preferences(
         self, context: RunContext, dietary_restrictions: Optional[str] = None, disliked_ingredients: Optional[str] = None, favorite_cuisines: Optional[str] = None, notes: Optional[str] = None
     ) -> str:
@@ -490,7 +452,6 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             notes: Other relevant info like skill level or time constraints  
         """
 
-        room = get_job_context().room
         linked_participant = context.session.room_io.linked_participant
         if not linked_participant:
             raise ToolError("No linked participant found")
@@ -505,74 +466,73 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             "notes": notes,
         }
 
-        try:
-            response = await room.local_participant.perform_rpc(
-                destination_identity=linked_participant.identity,
-                method="update_user_preferences",
-                payload=json.dumps(payload),
-                response_timeout=10.0,
-            )
-            return response
-        except ToolError:
-            raise
-        except Exception as e:
-            raise ToolError(f"error: {e!s}") from e
+        self.preferences.update(dietary_restrictions, disliked_ingredients, favorite_cuisines)
+
+        # Unset fields are dropped so a merged write never clears an earlier one.
+        self.rpc_writer.enqueue(
+            "update_user_preferences",
+            linked_participant.identity,
+            {k: v for k, v in payload.items() if v is not None},
+        )
+        return json.dumps({"success": True, "message": "Preferences updated successfully"})
 
     @function_tool(name="update_cooking_session")
+    @instrumented("update_cooking_session")
     async def _client_tool_update_cooking_session(
-        self, context: RunContext, ingredients: str, recipe_id: str, recipe_name: str, recipe_data: str, current_step: Optional[str] = None, current_phase: Optional[str] = None
+        self, context: RunContext, ingredients: Optional[str] = None, recipe_id: Optional[str] = None, recipe_name: Optional[str] = None, current_step: Optional[str] = None, current_phase: Optional[str] = None
     ) -> str:
         """
-         Update the cooking session state to track progress. Call this tool:                                                                     
-  - When user mentions ingredients: pass ingredients (comma-separated) and current_phase: \"ingredient_gathering\"                          
-  - When user picks a recipe: pass recipe_id (number), recipe_name (string), recipe_data (the full recipe instructions object), and       
-  current_phase: \"recipe_selection\"                                                                                                       
-  - When starting to cook: pass current_phase: \"cooking\" and current_step: 1                                                              
-  - As user progresses: pass current_step with the new step number                                                                        
-  - When cooking is complete: pass current_phase: \"completed\"         
+        Update the cooking session state to track progress. Only pass the fields that changed. Call this tool:
+  - When user mentions ingredients: pass ingredients (comma-separated) and current_phase: \"ingredient_gathering\"
+  - When user picks a recipe: pass recipe_id (number), recipe_name (string) and current_phase: \"recipe_selection\". The recipe instructions are saved automatically.
+  - When starting to cook: pass current_phase: \"cooking\" and current_step: 1
+  - As user progresses: pass current_step with the new step number
+  - When cooking is complete: pass current_phase: \"completed\"
 
         Args:
             ingredients: comma-separated list of ingredients (e.g., "chicken, rice, broccoli")
-            recipe_id: Spoonacular recipe ID number        
-            recipe_name: name of the selected recipe   
-            recipe_data: full recipe instructions object from get_recipe_instructions
-            current_step: step number (1, 2, 3, etc.)     
+            recipe_id: Spoonacular recipe ID number
+            recipe_name: name of the selected recipe
+            current_step: step number (1, 2, 3, etc.)
             current_phase: one of "greeting", "ingredient_gathering", "recipe_selection", "cooking", "completed"
         """
 
-        room = get_job_context().room
         linked_participant = context.session.room_io.linked_participant
         if not linked_participant:
             raise ToolError("No linked participant found")
 
-        payload = {
-            "ingredients": ingredients,
-        
-            "recipe_id": recipe_id,
-        
-            "recipe_name": recipe_name,
-        
-            "recipe_data": recipe_data,
-        
-            "current_step": current_step,
-        
-            "current_phase": current_phase,
-        }
+        # The recipe is saved once, when it is selected; later updates only
+        # carry what changed.
+        recipe_data = None
+        if self.cooking_session.is_new_recipe(recipe_id):
+            try:
+                body = await get_client().get(
+                    f"/recipes/{quote(str(recipe_id), safe='')}/analyzedInstructions"
+                )
+                recipe_data = json.loads(shape("analyzedInstructions", body))
+            except (ToolError, ValueError) as e:
+                logger.warning("could not attach instructions for recipe %s: %s", recipe_id, e)
 
         try:
-            response = await room.local_participant.perform_rpc(
-                destination_identity=linked_participant.identity,
-                method="update_cooking_session",
-                payload=json.dumps(payload),
-                response_timeout=10.0,
+            payload = self.cooking_session.apply(
+                ingredients=ingredients,
+                recipe_id=recipe_id,
+                recipe_name=recipe_name,
+                recipe_data=recipe_data,
+                current_step=current_step,
+                current_phase=current_phase,
             )
-            return response
-        except ToolError:
-            raise
-        except Exception as e:
+        except ValueError as e:
             raise ToolError(f"error: {e!s}") from e
+        await self.prompts.enter(self, self.cooking_session.current_phase)
+        if not payload:
+            return json.dumps({"success": True, "message": "Cooking session already up to date"})
+
+        self.rpc_writer.enqueue("update_cooking_session", linked_participant.identity, payload)
+        return json.dumps({"success": True, "message": "Cooking session updated successfully"})
 
     @function_tool(name="add_to_favorites")
+    @instrumented("add_to_favorites")
     async def _client_tool_add_to_favorites(
         self, context: RunContext, recipe_id: float, recipe_name: str, recipe_image: Optional[str] = None, rating: Optional[float] = None, description: Optional[str] = None, ingredients: Optional[str] = None
     ) -> str:
@@ -589,7 +549,6 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             ingredients: Comma-separated list of main ingredients
         """
 
-        room = get_job_context().room
         linked_participant = context.session.room_io.linked_participant
         if not linked_participant:
             raise ToolError("No linked participant found")
@@ -608,30 +567,238 @@ Stay focused on cooking, be genuinely helpful, and keep it conversational. Every
             "ingredients": ingredients,
         }
 
-        try:
-            response = await room.local_participant.perform_rpc(
-                destination_identity=linked_participant.identity,
-                method="add_to_favorites",
-                payload=json.dumps(payload),
-                response_timeout=10.0,
+        if recipe_id in self.favorited and rating is None:
+            return json.dumps({"success": True, "message": "Recipe is already in your favorites!", "alreadyExists": True})
+        self.favorited.add(recipe_id)
+
+        self.rpc_writer.enqueue(
+            "add_to_favorites",
+            linked_participant.identity,
+            {k: v for k, v in payload.items() if v is not None},
+            merge_key=recipe_id,
+        )
+        return json.dumps({"success": True, "message": "Added to favorites!"})
+
+    @function_tool(name="send_shopping_list")
+    @instrumented("send_shopping_list")
+    async def _client_tool_send_shopping_list(
+        self, context: RunContext, recipe_ids: Optional[str] = None
+    ) -> str:
+        """
+        Show the user a shopping list of what they're missing for one or more recipes, with duplicates merged and amounts added up. Call this when they ask what they need to buy.
+
+        Args:
+            recipe_ids: Comma-separated ids of the recipes to shop for. Defaults to the selected recipe.
+        """
+
+        linked_participant = context.session.room_io.linked_participant
+        if not linked_participant:
+            raise ToolError("No linked participant found")
+
+        ids = [int(i) for i in (recipe_ids or "").split(",") if i.strip().isdigit()]
+        if not ids and self.cooking_session.recipe_id is not None:
+            ids = [self.cooking_session.recipe_id]
+        if not ids:
+            raise ToolError("error: no recipe selected - pass the recipe ids")
+
+        shopping = ShoppingList(have=self.cooking_session.ingredients)
+        unknown = []
+        for recipe_id in dict.fromkeys(ids):
+            found = self._shopping_ingredients(recipe_id)
+            if found is None:
+                unknown.append(recipe_id)
+            else:
+                shopping.add_recipe(*found)
+        if not shopping.recipes:
+            raise ToolError("error: none of these recipes have been looked up yet - search or load them first")
+
+        items = shopping.items()
+        if items:
+            self.rpc_writer.enqueue(
+                "send_shopping_list",
+                linked_participant.identity,
+                {"recipe_name": shopping.title, "items": items},
             )
-            return response
-        except ToolError:
-            raise
-        except Exception as e:
-            raise ToolError(f"error: {e!s}") from e
+        return json.dumps({"success": True, "recipes": shopping.recipes, "items": items, "unknown_recipe_ids": unknown})
+
+    def _shopping_ingredients(self, recipe_id: int) -> Optional[tuple[str, list[dict]]]:
+        """A recipe's title and what to buy for it, from data already fetched this session.
+
+        Prefers the search result's missing ingredients, then the local recipe
+        corpus, then the names in the recipe's instructions. Nothing here
+        calls Spoonacular.
+        """
+
+        title = self.cooking_session.recipe_name if recipe_id == self.cooking_session.recipe_id else None
+        candidate = self.candidates.get(recipe_id)
+        if candidate is not None:
+            return title or candidate["title"] or f"Recipe {recipe_id}", candidate["missed"]
+
+        index = get_recipe_index()
+        recipe = index.get(recipe_id) if index is not None else None
+        if recipe is not None:
+            return title or recipe.get("title") or f"Recipe {recipe_id}", recipe_ingredients(recipe)
+
+        if self.steps is not None and self.steps.recipe_id == recipe_id:
+            steps = self.steps
+        else:
+            data = self.cooking_session.recipe_data if recipe_id == self.cooking_session.recipe_id else None
+            if not data:
+                cached = get_client().peek(f"/recipes/{recipe_id}/analyzedInstructions")
+                data = json.loads(cached) if cached else None
+            steps = RecipeSteps.from_instructions(recipe_id, data)
+        if not steps:
+            return None
+        return title or f"Recipe {recipe_id}", [{"name": n} for n in steps.overview()["ingredients"]]
+
+
+def prewarm(proc: JobProcess):
+    started = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+
+    client = get_client()
+    warmed = client.warm()
+    proc.userdata["spoonacular"] = client
+    logger.info("prewarmed spoonacular cache with %d stored responses", warmed)
+
+    index = get_index()
+    if client.store is not None:
+        for body in client.store.bodies("ingredients/search"):
+            index.learn_from_search(body)
+    logger.info("prewarmed ingredient index with %d names", len(index))
+
+    recipes = get_recipe_index()
+    if recipes is not None:
+        index.add_many(i["name"] for r in recipes.recipes for i in recipe_ingredients(r))
+        logger.info("prewarmed recipe index with %d recipes", len(recipes))
+
+    similarity = get_similarity_index()
+    if recipes is not None:
+        similarity.add_many(recipes.recipes)
+    if client.store is not None:
+        similarity.learn_from_cache(client.store.entries("summary") + client.store.entries("analyzedInstructions"))
+    logger.info("prewarmed similarity index with %d recipes", len(similarity))
+
+    # Building one agent resolves its tools and instructions, so the first
+    # job doesn't pay for it.
+    agent = DefaultAgent()
+    for phase, size in agent.prompts.sizes().items():
+        logger.info(
+            "prompt context for %s: %d instruction bytes, %d tools (%d schema bytes)",
+            phase, size["instruction_bytes"], size["tools"], size["tool_schema_bytes"],
+            extra={"phase": phase, **size},
+        )
+    elapsed = time.perf_counter() - started
+    logger.info("worker prewarm finished in %.0f ms", elapsed * 1000)
+    if elapsed > PREWARM_TIMEOUT / 2:
+        logger.warning(
+            "prewarm took %.1f s of its %.0f s budget; raise MISE_PREWARM_TIMEOUT or shrink the corpus",
+            elapsed, PREWARM_TIMEOUT,
+        )
 
 
-server = AgentServer()
+# Prewarm builds the recipe, ingredient and similarity indexes synchronously;
+# with a 100k recipe corpus that is several seconds on top of loading it,
+# too close to livekit's 10 s default for a process to initialize.
+PREWARM_TIMEOUT = float(os.getenv("MISE_PREWARM_TIMEOUT", "30"))
+
+worker_load = WorkerLoad()
+server = AgentServer(
+    initialize_process_timeout=PREWARM_TIMEOUT,
+    load_fnc=worker_load,
+    load_threshold=worker_load.server_threshold(),
+    prometheus_port=PROMETHEUS_PORT,
+    prometheus_multiproc_dir=PROMETHEUS_MULTIPROC_DIR if PROMETHEUS_PORT else None,
+)
+server.setup_fnc = prewarm
 
 @server.rtc_session(agent_name="Bruno")
 async def entrypoint(ctx: JobContext):
+    accepted = time.perf_counter()
+    # Warm the Spoonacular connection while the room connects.
+    preconnect = asyncio.ensure_future(get_client().preconnect())
+
     session = AgentSession(
         llm=xai.realtime.RealtimeModel(voice="leo"),
+        vad=ctx.proc.userdata.get("vad"),
     )
 
+    def on_first_audio(ev):
+        if ev.new_state != "speaking":
+            return
+        session.off("agent_state_changed", on_first_audio)
+        logger.info(
+            "job accept to first audio: %.0f ms (prewarmed: %s)",
+            (time.perf_counter() - accepted) * 1000, "vad" in ctx.proc.userdata,
+        )
+
+    session.on("agent_state_changed", on_first_audio)
+    TurnTimer().attach(session)
+
+    ACTIVE_SESSIONS.inc()
+
+    load_reporter = JobLoadReporter.acquire()
+    diagnostics = LoopDiagnostics.acquire(ctx.job.id, load_reporter)
+
+    async def session_ended():
+        ACTIVE_SESSIONS.dec()
+        # Diagnostics first: once the reporter stops, its heartbeat does too.
+        await diagnostics.release(ctx.job.id)
+        await load_reporter.release()
+
+    ctx.add_shutdown_callback(session_ended)
+
+    agent = DefaultAgent()
+    ctx.add_shutdown_callback(agent.prefetcher.aclose)
+    ctx.add_shutdown_callback(agent.rpc_writer.aclose)
+    agent.trace = TraceRecorder.for_job(ctx.job.id)
+    if agent.trace is not None:
+        ctx.add_shutdown_callback(agent.trace.aclose)
+
+    pocketbase = get_pocketbase()
+    recorder: Optional[TranscriptRecorder] = None
+
+    async def connect_persistence(participant: rtc.RemoteParticipant) -> None:
+        """Write straight to PocketBase as the signed-in user, with the token their page hands over."""
+        nonlocal recorder
+        token, session_record_id = await load_persistence_auth(ctx.room.local_participant, participant)
+        if not (token and session_record_id):
+            return
+        try:
+            persistence = await SessionPersistence.connect(pocketbase, token, session_record_id)
+        except (PocketBaseError, KeyError, TypeError) as e:
+            logger.warning("writing through the client, PocketBase refused the user's token: %s", e)
+            return
+        agent.rpc_writer.persistence = persistence
+        recorder = TranscriptRecorder(persistence, ctx.job.id)
+        recorder.attach(session)
+        ctx.add_shutdown_callback(recorder.aclose)
+        # Tells the kitchen page to stop rewriting the transcript itself.
+        await ctx.room.local_participant.set_attributes({"mise.transcript": "agent"})
+
+    async def preload_context() -> SessionContext:
+        participant = await ctx.wait_for_participant()
+        context, _ = await asyncio.gather(
+            load_session_context(ctx.room.local_participant, participant),
+            connect_persistence(participant) if pocketbase is not None else asyncio.sleep(0),
+        )
+        if context.continuation:
+            agent.resume(context.continuation)
+            if recorder is not None:
+                recorder.continue_from(context.continuation.get("previous_transcript"))
+        return context
+
+    # Runs while session.start connects; on_enter waits for it before greeting.
+    agent.context_task = asyncio.ensure_future(preload_context())
+
+    async def cancel_preload():
+        agent.context_task.cancel()
+        preconnect.cancel()
+
+    ctx.add_shutdown_callback(cancel_preload)
+
     await session.start(
-        agent=DefaultAgent(),
+        agent=agent,
         room=ctx.room,
         room_options=room_io.RoomOptions(
             audio_input=room_io.AudioInputOptions(
@@ -640,6 +807,19 @@ async def entrypoint(ctx: JobContext):
         ),
     )
 
+    async def log_session_stats():
+        logger.info("spoonacular client stats: %s", get_client().stats())
+        logger.info("tool result shaping stats: %s", shaping_stats.as_dict())
+        logger.info("client write stats: %s", agent.rpc_writer.stats())
+        logger.info("event loop stalls over %.0f ms: %d", diagnostics.slow_callback * 1000, diagnostics.stalls)
+        if pocketbase is not None:
+            logger.info("pocketbase stats: %s", pocketbase.stats())
+        if recorder is not None:
+            logger.info("transcript stats: %s", recorder.stats())
+
+    ctx.add_shutdown_callback(log_session_stats)
+
 
 if __name__ == "__main__":
+    install_profile_toggle()
     cli.run_app(server)
@@ -0,0 +1,149 @@
+"""Load/latency benchmark for the agent's Spoonacular tools.
+
+Drives DefaultAgent's tool functions directly with N concurrent simulated
+sessions, each walking the search -> summarize -> instructions -> similar
+flow. By default it starts mock_spoonacular in-process so no API quota is
+spent.
+
+    python benchmark.py --sessions 200 --concurrency 50 --latency 0.3
+    python benchmark.py --base-url http://127.0.0.1:8089   # external mock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def call(self, name: str, tool, *args, context=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await tool(context, *args, **kwargs)
+        except Exception:
+            self.errors[name] += 1
+            return None
+        finally:
+            self.latencies[name].append(time.perf_counter() - started)
+
+
+def print_latencies(recorder: Recorder, sessions: int, elapsed: float) -> None:
+    total_calls = sum(len(v) for v in recorder.latencies.values())
+    print(f"{sessions} sessions, {total_calls} tool calls in {elapsed:.2f}s "
+          f"({total_calls / elapsed:.1f} calls/s, {sessions / elapsed:.1f} sessions/s)")
+    print(f"{'tool':32} {'calls':>6} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, samples in recorder.latencies.items():
+        print(f"{name:32} {len(samples):6d} {recorder.errors[name]:5d} "
+              f"{percentile(samples, 50) * 1000:8.1f} {percentile(samples, 95) * 1000:8.1f} "
+              f"{percentile(samples, 99) * 1000:8.1f}")
+
+
+async def run_session(agent_cls, recorder: Recorder, rng: random.Random, ingredients: list[str]) -> None:
+    from mock_spoonacular import INGREDIENTS
+
+    agent = agent_cls()
+    try:
+        # Skew towards the head of the list so popular ingredients repeat
+        # across sessions the way they do in production.
+        picked = {INGREDIENTS[min(int(rng.paretovariate(1.2)) - 1, len(INGREDIENTS) - 1)] for _ in range(3)}
+        said = ", ".join(picked | set(rng.sample(ingredients, 1)))
+
+        await recorder.call("validate_ingredients", agent._http_tool_validate_ingredients, said)
+        found = await recorder.call("search_recipes_by_ingredients", agent._http_tool_search_recipes_by_ingredients, said)
+        results = json.loads(found or "[]")
+        # A result cut to fit the budget comes wrapped with a truncated count.
+        if isinstance(results, dict):
+            results = results.get("results") or []
+        ids = [str(r["id"]) for r in results][:3]
+        if not ids:
+            return
+        await recorder.call("summarize_recipes", agent._http_tool_summarize_recipes, ",".join(ids))
+        choice = rng.choice(ids)
+        await recorder.call("get_recipe_instructions", agent._http_tool_get_recipe_instructions, choice)
+        await recorder.call("get_similar_recipes", agent._http_tool_get_similar_recipes, choice)
+    finally:
+        await agent.prefetcher.aclose()
+
+
+async def fetch_upstream_total(base_url: str) -> int:
+    import aiohttp
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/__stats") as resp:
+                return (await resp.json())["total"]
+    except (aiohttp.ClientError, ValueError, KeyError):
+        return -1
+
+
+async def main(args: argparse.Namespace) -> None:
+    runner = None
+    base_url = args.base_url
+    if base_url is None:
+        import mock_spoonacular
+
+        runner, _ = await mock_spoonacular.start(
+            port=args.mock_port, latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, seed=args.seed,
+        )
+        base_url = f"http://127.0.0.1:{args.mock_port}"
+
+    # The client reads its configuration at import time.
+    os.environ["SPOONACULAR_BASE_URL"] = base_url
+    os.environ.setdefault("MISE_RECIPE_STORE_PATH", args.store)
+    from livekit.agents import utils
+    from agent import DefaultAgent
+    from mock_spoonacular import INGREDIENTS
+    from spoonacular import get_client
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    upstream_before = await fetch_upstream_total(base_url)
+
+    async def session_slot(n: int) -> None:
+        async with semaphore:
+            await run_session(DefaultAgent, recorder, random.Random(rng.random() + n), INGREDIENTS)
+
+    started = time.perf_counter()
+    async with utils.http_context.open():
+        await asyncio.gather(*(session_slot(n) for n in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    upstream = await fetch_upstream_total(base_url) - upstream_before
+
+    print_latencies(recorder, args.sessions, elapsed)
+    if upstream >= 0:
+        print(f"upstream requests: {upstream} ({upstream / args.sessions:.2f} per session)")
+    print(f"client stats: {json.dumps(get_client().stats())}")
+
+    if runner is not None:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="sessions running at once")
+    parser.add_argument("--base-url", default=None, help="use an already running Spoonacular stand-in")
+    parser.add_argument("--mock-port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="mock extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock injected error rate")
+    parser.add_argument("--store", default="", help="recipe store path (empty disables the on-disk store)")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger("agent-Bruno")
+
+PHASES = ("greeting", "ingredient_gathering", "recipe_selection", "cooking", "completed")
+
+
+def _split(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class CookingSessionState:
+    """Agent-side copy of the session's cooking_sessions record.
+
+    The selected recipe's instructions are held here once; every later update
+    only carries the fields that actually changed, so the model never has to
+    re-emit the recipe and the client never has to re-write it.
+    """
+
+    FIELDS = ("ingredients", "recipe_id", "recipe_name", "recipe_data", "current_step", "current_phase")
+
+    def __init__(self) -> None:
+        self.ingredients: list[str] = []
+        self.recipe_id: Optional[int] = None
+        self.recipe_name: Optional[str] = None
+        self.recipe_data: Any = None
+        self.current_step: Optional[int] = None
+        self.current_phase: Optional[str] = None
+
+    def snapshot(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def load(self, record: dict) -> None:
+        """Adopt state from an existing session (e.g. a continuation) without producing a delta."""
+        ingredients = record.get("ingredients")
+        if isinstance(ingredients, str):
+            ingredients = _split(ingredients)
+        self.ingredients = list(ingredients or [])
+        self.recipe_id = _as_int(record.get("recipe_id") or record.get("selected_recipe_id"))
+        self.recipe_name = record.get("recipe_name")
+        self.recipe_data = record.get("recipe_data")
+        self.current_step = _as_int(record.get("current_step"))
+        self.current_phase = record.get("current_phase")
+
+    def is_new_recipe(self, recipe_id: Optional[str]) -> bool:
+        return recipe_id is not None and _as_int(recipe_id) not in (None, self.recipe_id)
+
+    def apply(
+        self,
+        ingredients: Optional[str] = None,
+        recipe_id: Optional[str] = None,
+        recipe_name: Optional[str] = None,
+        recipe_data: Any = None,
+        current_step: Optional[str] = None,
+        current_phase: Optional[str] = None,
+    ) -> dict:
+        """Apply an update and return the delta to send, or {} if nothing changed.
+
+        Arguments left as None are treated as unchanged.
+        """
+
+        if current_phase is not None and current_phase not in PHASES:
+            raise ValueError(f"current_phase must be one of {', '.join(PHASES)}")
+
+        changes = {
+            "ingredients": _split(ingredients) if ingredients is not None else None,
+            "recipe_id": _as_int(recipe_id) if recipe_id is not None else None,
+            "recipe_name": recipe_name,
+            "recipe_data": recipe_data,
+            "current_step": _as_int(current_step) if current_step is not None else None,
+            "current_phase": current_phase,
+        }
+
+        delta = {}
+        for field, value in changes.items():
+            if value is None or value == getattr(self, field):
+                continue
+            setattr(self, field, value)
+            delta[field] = value
+        return delta
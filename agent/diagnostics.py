@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from worker_load import JobLoadReporter
+
+logger = logging.getLogger("agent-Bruno")
+
+# The loop counts as blocked once its heartbeat is this late; the stack it is
+# stuck in is logged then, and the stall's length once it recovers.
+SLOW_CALLBACK = float(os.getenv("MISE_SLOW_CALLBACK_MS", "250")) / 1000
+# How often the watchdog thread checks the heartbeat.
+WATCH_INTERVAL = 0.05
+# Sampling profiler: on while PROFILE_FLAG exists (SIGUSR2 to the worker or a
+# job process toggles it, as does touching/removing the file) or always with
+# MISE_PROFILE=1. Profiles are written per job as collapsed stacks, the input
+# format of flamegraph.pl and speedscope.
+DIAGNOSTICS_DIR = os.getenv("MISE_DIAGNOSTICS_DIR", os.path.join(os.path.dirname(__file__), ".cache", "diagnostics"))
+PROFILE_FLAG = os.path.join(DIAGNOSTICS_DIR, "profiling")
+PROFILE_ALWAYS = os.getenv("MISE_PROFILE", "") == "1"
+PROFILE_HZ = float(os.getenv("MISE_PROFILE_HZ", "100"))
+MAX_DEPTH = 64
+
+
+def toggle_profiling(*_) -> None:
+    """Turn profiling on or off for every job process sharing DIAGNOSTICS_DIR."""
+    try:
+        if os.path.exists(PROFILE_FLAG):
+            os.remove(PROFILE_FLAG)
+        else:
+            os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+            open(PROFILE_FLAG, "w").close()
+    except OSError as e:
+        logger.warning("could not toggle profiling: %s", e)
+
+
+def install_profile_toggle() -> None:
+    """Make SIGUSR2 toggle profiling; only possible from the main thread."""
+    if hasattr(signal, "SIGUSR2") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR2, toggle_profiling)
+
+
+def _stack(frame, lines: bool) -> list[str]:
+    """``file:function`` entries, outermost first."""
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        code = frame.f_code
+        entry = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        stack.append(f"{entry}:{frame.f_lineno}" if lines else entry)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class LoopDiagnostics:
+    """Event-loop watchdog and sampling profiler for this job process.
+
+    The heartbeat is the one JobLoadReporter stamps while it samples loop
+    lag, so there is a single lag measurement per process. A daemon thread
+    checks it, and when it falls SLOW_CALLBACK behind it snapshots the loop
+    thread's stack, which is the code blocking every session in the process.
+    While profiling is on, the same thread samples that stack PROFILE_HZ
+    times a second into per-job totals in milliseconds. Shared by every job
+    in the process and stopped with the last.
+    """
+
+    _instance: Optional["LoopDiagnostics"] = None
+
+    def __init__(self, slow_callback: float = SLOW_CALLBACK, profile_hz: float = PROFILE_HZ) -> None:
+        self.slow_callback = slow_callback
+        self.profile_hz = profile_hz
+        self.stalls = 0
+        self.profiling = False
+        self._reporter: Optional[JobLoadReporter] = None
+        self._loop_thread = threading.get_ident()
+        self._jobs: dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def acquire(cls, job_id: str, reporter: JobLoadReporter) -> "LoopDiagnostics":
+        """Register a job; ``reporter`` is the process's acquired JobLoadReporter."""
+        if cls._instance is None:
+            cls._instance = cls()
+            install_profile_toggle()
+        diagnostics = cls._instance
+        with diagnostics._lock:
+            diagnostics._jobs[job_id] = Counter()
+        if diagnostics._thread is None:
+            diagnostics._start(reporter)
+        return diagnostics
+
+    async def release(self, job_id: str) -> None:
+        with self._lock:
+            samples = self._jobs.pop(job_id, None)
+            last = not self._jobs
+        if samples:
+            await asyncio.to_thread(self._write_profile, job_id, samples)
+        if last and self._thread is not None:
+            self._stop.set()
+            self._thread = None
+
+    def _start(self, reporter: JobLoadReporter) -> None:
+        self._loop_thread = threading.get_ident()
+        self._reporter = reporter
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, args=(self._stop,), name="mise-diagnostics", daemon=True)
+        self._thread.start()
+
+    def _watch(self, stop: threading.Event) -> None:
+        stalled_since: Optional[float] = None
+        stall_top = ""
+        next_flag_check = 0.0
+        last_sample = time.monotonic()
+        while not stop.is_set():
+            stop.wait(1 / self.profile_hz if self.profiling else WATCH_INTERVAL)
+            now = time.monotonic()
+            beat = self._reporter.beat
+            if stalled_since is None and now - beat > self.slow_callback + self._reporter.step:
+                stalled_since = beat
+                stack = self._loop_stack(lines=True)
+                stall_top = stack[-1] if stack else "?"
+                self.stalls += 1
+                logger.warning(
+                    "event loop blocked for %.0f ms in %s", (now - beat) * 1000, stall_top,
+                    extra={"loop_blocked_ms": round((now - beat) * 1000, 1), "stack": stack},
+                )
+            elif stalled_since is not None and beat > stalled_since:
+                logger.warning(
+                    "event loop was blocked for %.0f ms in %s", (beat - stalled_since) * 1000, stall_top,
+                    extra={"loop_blocked_ms": round((beat - stalled_since) * 1000, 1), "top": stall_top},
+                )
+                stalled_since = None
+
+            if now >= next_flag_check:
+                next_flag_check = now + 1.0
+                self._set_profiling(PROFILE_ALWAYS or os.path.exists(PROFILE_FLAG))
+            if self.profiling:
+                # Weighted by the time since the previous sample: a sample
+                # delayed waiting for the GIL stands for the busy time it missed.
+                weight = max(1, round((now - last_sample) * 1000))
+                stack = ";".join(self._loop_stack(lines=False))
+                with self._lock:
+                    for samples in self._jobs.values():
+                        samples[stack] += weight
+            last_sample = now
+
+    def _set_profiling(self, on: bool) -> None:
+        if on == self.profiling:
+            return
+        self.profiling = on
+        logger.info("sampling profiler %s at %g Hz", "started" if on else "stopped", self.profile_hz)
+        if on:
+            return
+        with self._lock:
+            finished = {job_id: samples for job_id, samples in self._jobs.items() if samples}
+            for job_id in finished:
+                self._jobs[job_id] = Counter()
+        for job_id, samples in finished.items():
+            self._write_profile(job_id, samples)
+
+    def _loop_stack(self, lines: bool) -> list[str]:
+        frame = sys._current_frames().get(self._loop_thread)
+        return _stack(frame, lines) if frame is not None else []
+
+    def _write_profile(self, job_id: str, samples: Counter) -> None:
+        directory = os.path.join(DIAGNOSTICS_DIR, "profiles")
+        path = os.path.join(directory, f"{job_id}-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.warning("could not write profile for %s: %s", job_id, e)
+            return
+        logger.info("profile for job %s written to %s (%d ms sampled)", job_id, path, sum(samples.values()))
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+from spoonacular import SpoonacularClient
+
+logger = logging.getLogger("agent-Bruno")
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.strip().lower().split())
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up early once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def plural_variants(name: str) -> set[str]:
+    """Singular and plural spellings of ``name``, changing only its last word."""
+    variants = {name + "s", name + "es"}
+    if name.endswith("s"):
+        variants.add(name[:-1])
+    if name.endswith("es"):
+        variants.add(name[:-2])
+    if name.endswith("ies"):
+        variants.add(name[:-3] + "y")
+    if name.endswith("y"):
+        variants.add(name[:-1] + "ies")
+    variants.discard(name)
+    return variants
+
+
+def is_substitution(a: str, b: str) -> bool:
+    """True when ``a`` and ``b`` differ in exactly one character at the same position."""
+    return len(a) == len(b) and sum(ca != cb for ca, cb in zip(a, b)) == 1
+
+
+class IngredientIndex:
+    """Fuzzy lookup over ingredient names Spoonacular has already returned.
+
+    Exact names and plural-only variants always match. Other candidates are
+    gathered from a trigram inverted index and ranked by Dice similarity; the
+    best one is only accepted if it is also within a small edit distance, so
+    "tomatos" resolves to "tomatoes" but "chicken" does not resolve to
+    "chicken breast". Names shorter than ``min_fuzzy_length`` and candidates
+    one substituted letter away are never fuzzy-matched, since that is how
+    different ingredients differ ("beef" and "beet", "lima" and "lime");
+    those go to Spoonacular's ingredient search instead.
+    """
+
+    def __init__(self, min_similarity: float = 0.6, min_fuzzy_length: int = 6) -> None:
+        self.min_similarity = min_similarity
+        self.min_fuzzy_length = min_fuzzy_length
+        self._names: set[str] = set()
+        self._grams: dict[str, set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str) -> None:
+        name = normalize(name)
+        if not name or name in self._names:
+            return
+        self._names.add(name)
+        for gram in trigrams(name):
+            self._grams[gram].add(name)
+
+    def add_many(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.add(name)
+
+    def learn_from_search(self, body: str) -> list[str]:
+        """Index the names in a /food/ingredients/search response and return them in order."""
+        try:
+            names = [r["name"] for r in json.loads(body).get("results", []) if r.get("name")]
+        except (ValueError, AttributeError, KeyError, TypeError):
+            return []
+        self.add_many(names)
+        return [normalize(n) for n in names]
+
+    def match(self, query: str) -> Optional[str]:
+        query = normalize(query)
+        if not query:
+            return None
+        if query in self._names:
+            return query
+        plural = next((v for v in sorted(plural_variants(query)) if v in self._names), None)
+        if plural is not None or len(query) < self.min_fuzzy_length:
+            return plural
+
+        query_grams = trigrams(query)
+        counts: dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for name in self._grams.get(gram, ()):
+                counts[name] += 1
+
+        limit = max(1, len(query) // 4)
+        best, best_score = None, self.min_similarity
+        for name, shared in counts.items():
+            score = 2 * shared / (len(query_grams) + len(trigrams(name)))
+            if score < best_score or is_substitution(query, name):
+                continue
+            if edit_distance(query, name, limit) <= limit:
+                best, best_score = name, score
+        return best
+
+
+async def resolve_ingredients(
+    names: list[str], client: SpoonacularClient, index: IngredientIndex, concurrency: int = 4
+) -> tuple[dict[str, Optional[str]], list[str]]:
+    """Normalize every name, using the local index first and Spoonacular for the rest.
+
+    Lookups that miss the index run concurrently on the shared client, at most
+    ``concurrency`` at a time. Returns the checked names, mapped to None when
+    Spoonacular doesn't recognize them, and separately the names whose lookup
+    failed, so an outage isn't reported as unknown ingredients.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(name: str) -> Optional[str]:
+        local = index.match(name)
+        if local is not None:
+            return local
+        async with semaphore:
+            body = await client.get("/food/ingredients/search", {"query": name})
+        results = index.learn_from_search(body)
+        return results[0] if results else None
+
+    unique = list(dict.fromkeys(n.strip() for n in names if n.strip()))
+    resolved = await asyncio.gather(*(resolve(n) for n in unique), return_exceptions=True)
+    mapping, failed = {}, []
+    for name, result in zip(unique, resolved):
+        if isinstance(result, BaseException):
+            logger.warning("could not validate ingredient %r: %s", name, result)
+            failed.append(name)
+        else:
+            mapping[name] = result
+    return mapping, failed
+
+
+_index: Optional[IngredientIndex] = None
+
+
+def get_index() -> IngredientIndex:
+    """Return the process-wide ingredient index, creating it on first use."""
+    global _index
+    if _index is None:
+        _index = IngredientIndex()
+    return _index
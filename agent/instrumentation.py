@@ -0,0 +1,190 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from typing import Any, Callable, Optional
+from livekit.agents import AgentSession, ToolError
+from prometheus_client import Counter, Gauge, Histogram
+from traffic import digest
+
+logger = logging.getLogger("agent-Bruno")
+
+# Served by the worker's own Prometheus endpoint; job processes write their
+# samples through the multiprocess directory. Every tool call, client RPC and
+# turn is also logged on the agent-Bruno logger with its numbers in ``extra``.
+PROMETHEUS_PORT = int(os.getenv("MISE_PROMETHEUS_PORT", "0")) or None
+PROMETHEUS_MULTIPROC_DIR = os.getenv(
+    "MISE_PROMETHEUS_MULTIPROC_DIR", os.path.join(os.path.dirname(__file__), ".cache", "prometheus")
+)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+TOOL_DURATION = Histogram(
+    "mise_tool_duration_seconds", "Tool call duration", ["tool", "outcome"], buckets=_LATENCY_BUCKETS
+)
+TOOL_RESULT_BYTES = Histogram(
+    "mise_tool_result_bytes", "Size of tool results handed to the model", ["tool"],
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 65536),
+)
+UPSTREAM_DURATION = Histogram(
+    "mise_upstream_request_duration_seconds", "Upstream HTTP request duration",
+    ["service", "endpoint", "status"], buckets=_LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "mise_spoonacular_lookups_total", "Spoonacular lookups by where they were answered", ["endpoint", "result"]
+)
+RPC_DURATION = Histogram(
+    "mise_rpc_duration_seconds", "Client RPC duration", ["method", "outcome"], buckets=_LATENCY_BUCKETS
+)
+FIRST_AUDIO = Histogram(
+    "mise_turn_first_audio_seconds", "End of user speech to first agent audio",
+    buckets=(0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10),
+)
+ACTIVE_SESSIONS = Gauge("mise_active_sessions", "Sessions running on this worker", multiprocess_mode="livesum")
+UPSTREAM_IN_FLIGHT = Gauge(
+    "mise_upstream_in_flight", "Upstream HTTP requests awaiting a response", ["service"], multiprocess_mode="livesum"
+)
+
+# Per tool call: upstream time and cache results gathered while it runs.
+_call: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("mise_tool_call", default=None)
+
+
+# Upstream requests awaiting a response in this process, for the worker's load report.
+_in_flight = 0
+
+
+@contextlib.contextmanager
+def upstream_request(service: str):
+    """Count an upstream HTTP request as in flight for as long as the block runs."""
+    global _in_flight
+    _in_flight += 1
+    UPSTREAM_IN_FLIGHT.labels(service).inc()
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+        UPSTREAM_IN_FLIGHT.labels(service).dec()
+
+
+def upstream_in_flight() -> int:
+    return _in_flight
+
+
+def record_upstream(service: str, endpoint: str, status: Any, seconds: float) -> None:
+    UPSTREAM_DURATION.labels(service, endpoint, str(status)).observe(seconds)
+    call = _call.get()
+    if call is not None:
+        call["upstream_ms"] += seconds * 1000
+        call["upstream_requests"] += 1
+
+
+def record_lookup(endpoint: str, result: str) -> None:
+    """Count where a Spoonacular GET was answered: memory, store, coalesced, upstream or stale."""
+    CACHE_LOOKUPS.labels(endpoint, result).inc()
+    call = _call.get()
+    if call is not None:
+        call["cache"].append(result)
+
+
+def record_rpc(method: str, outcome: str, seconds: float) -> None:
+    RPC_DURATION.labels(method, outcome).observe(seconds)
+    logger.info(
+        "rpc %s %s in %.0f ms", method, outcome, seconds * 1000,
+        extra={"rpc": method, "outcome": outcome, "duration_ms": round(seconds * 1000, 1)},
+    )
+
+
+def instrumented(tool: str) -> Callable:
+    """Time a tool method and log it with its upstream time, cache results and result size.
+
+    When the owning agent has a ``trace`` (see traffic.py), the call, its
+    result and the upstream responses and RPCs it causes are recorded there.
+    Goes under ``@function_tool`` so the tool keeps its signature and docstring.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            call = {"upstream_ms": 0.0, "upstream_requests": 0, "cache": []}
+            token = _call.set(call)
+            trace = getattr(args[0], "trace", None) if args else None
+            tracing = contextlib.nullcontext() if trace is None else trace.active()
+            if trace is not None:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+                trace.event("call", tool=tool, args={
+                    k: v for k, v in arguments.items() if k not in ("self", "context")
+                })
+            started = time.perf_counter()
+            outcome, result = "ok", None
+            try:
+                with tracing:
+                    result = await fn(*args, **kwargs)
+                return result
+            except ToolError:
+                outcome = "tool_error"
+                raise
+            except BaseException:
+                outcome = "exception"
+                raise
+            finally:
+                _call.reset(token)
+                seconds = time.perf_counter() - started
+                size = len(result.encode()) if isinstance(result, str) else 0
+                TOOL_DURATION.labels(tool, outcome).observe(seconds)
+                if outcome == "ok":
+                    TOOL_RESULT_BYTES.labels(tool).observe(size)
+                if trace is not None:
+                    trace.event(
+                        "result", tool=tool, outcome=outcome, ms=round(seconds * 1000, 1),
+                        bytes=size, digest=digest(result),
+                    )
+                logger.info(
+                    "tool %s %s in %.0f ms (upstream %.0f ms, %d bytes)",
+                    tool, outcome, seconds * 1000, call["upstream_ms"], size,
+                    extra={
+                        "tool": tool,
+                        "outcome": outcome,
+                        "duration_ms": round(seconds * 1000, 1),
+                        "upstream_ms": round(call["upstream_ms"], 1),
+                        "upstream_requests": call["upstream_requests"],
+                        "cache": call["cache"],
+                        "result_bytes": size,
+                    },
+                )
+
+        return wrapper
+
+    return decorator
+
+
+class TurnTimer:
+    """Times each turn from the end of the user's speech to the agent's first audio."""
+
+    def __init__(self) -> None:
+        self._user_done: Optional[float] = None
+        self.turns = 0
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("user_state_changed", self._on_user_state)
+        session.on("agent_state_changed", self._on_agent_state)
+
+    def _on_user_state(self, ev) -> None:
+        if ev.old_state == "speaking" and ev.new_state != "speaking":
+            self._user_done = time.perf_counter()
+
+    def _on_agent_state(self, ev) -> None:
+        if ev.new_state != "speaking" or self._user_done is None:
+            return
+        seconds = time.perf_counter() - self._user_done
+        self._user_done = None
+        self.turns += 1
+        FIRST_AUDIO.observe(seconds)
+        logger.info(
+            "turn %d first audio after %.0f ms", self.turns, seconds * 1000,
+            extra={"turn": self.turns, "first_audio_ms": round(seconds * 1000, 1)},
+        )
@@ -0,0 +1,207 @@
+"""Local stand-in for the Spoonacular endpoints the agent uses.
+
+Serves deterministic fixture data with configurable latency and error
+injection, and counts requests per endpoint at /__stats. Point the agent at it
+with SPOONACULAR_BASE_URL=http://127.0.0.1:8089.
+
+    python mock_spoonacular.py --port 8089 --latency 0.3 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+from aiohttp import web
+
+INGREDIENTS = [
+    "chicken", "chicken breast", "rice", "broccoli", "garlic", "onion", "tomatoes",
+    "basil", "pasta", "parmesan", "eggs", "milk", "butter", "spinach", "mushrooms",
+    "bell pepper", "carrots", "potatoes", "beef", "ground beef", "salmon", "lemon",
+    "ginger", "soy sauce", "cilantro", "black beans", "corn", "tortillas", "cheddar",
+    "bacon", "shrimp", "coconut milk", "chickpeas", "zucchini", "honey", "yogurt",
+]
+CUISINES = ["italian", "mexican", "thai", "indian", "american", "chinese", "mediterranean"]
+EQUIPMENT = ["frying pan", "pot", "oven", "baking sheet", "bowl", "whisk", "knife"]
+
+
+@lru_cache(maxsize=None)
+def make_recipe(recipe_id: int) -> dict:
+    """Build a stable fake recipe for an id. The result is shared; don't mutate it."""
+    rng = random.Random(recipe_id)
+    names = rng.sample(INGREDIENTS, rng.randint(4, 9))
+    return {
+        "id": recipe_id,
+        "title": f"{names[0].title()} {rng.choice(['Skillet', 'Bowl', 'Bake', 'Stir Fry', 'Soup'])} #{recipe_id}",
+        "image": f"https://img.spoonacular.com/recipes/{recipe_id}-312x231.jpg",
+        "imageType": "jpg",
+        "readyInMinutes": rng.choice([15, 20, 30, 45, 60]),
+        "servings": rng.choice([2, 4, 6]),
+        "cuisines": rng.sample(CUISINES, 1),
+        "diets": rng.sample(["gluten free", "vegetarian", "dairy free"], rng.randint(0, 2)),
+        "summary": f"<b>{names[0].title()} dish</b> with <a href=\"#\">{names[1]}</a> and {names[2]}. "
+                   "It is a <b>crowd pleaser</b> and pairs well with a simple salad. " * 3,
+        "extendedIngredients": [
+            {"id": INGREDIENTS.index(n) + 1, "name": n, "nameClean": n,
+             "amount": rng.choice([0.5, 1, 2, 3]), "unit": rng.choice(["cup", "tablespoon", "g", ""]),
+             "image": f"{n.replace(' ', '-')}.jpg"}
+            for n in names
+        ],
+    }
+
+
+def make_instructions(recipe: dict) -> list:
+    rng = random.Random(recipe["id"] * 7)
+    names = [i["name"] for i in recipe["extendedIngredients"]]
+    steps = []
+    for number in range(1, rng.randint(4, 10)):
+        used = rng.sample(names, min(2, len(names)))
+        step = {
+            "number": number,
+            "step": f"Combine the {used[0]} with the {used[-1]} and cook until done, stirring occasionally.",
+            "ingredients": [{"id": INGREDIENTS.index(n) + 1, "name": n, "localizedName": n, "image": f"{n}.jpg"} for n in used],
+            "equipment": [{"id": 1, "name": e, "localizedName": e, "image": f"{e}.jpg"} for e in rng.sample(EQUIPMENT, 1)],
+        }
+        if rng.random() < 0.4:
+            step["length"] = {"number": rng.choice([5, 10, 20]), "unit": "minutes"}
+        steps.append(step)
+    return [{"name": "", "steps": steps}]
+
+
+class MockSpoonacular:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 corpus_size: int = 500, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.corpus_size = corpus_size
+        self.requests: Counter = Counter()
+        self._rng = random.Random(seed)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/recipes/findByIngredients", self.find_by_ingredients)
+        app.router.add_get("/recipes/complexSearch", self.complex_search)
+        app.router.add_get("/recipes/informationBulk", self.information_bulk)
+        app.router.add_get("/recipes/{id}/similar", self.similar)
+        app.router.add_get("/recipes/{id}/summary", self.summary)
+        app.router.add_get("/recipes/{id}/analyzedInstructions", self.analyzed_instructions)
+        app.router.add_get("/food/ingredients/search", self.ingredient_search)
+        app.router.add_get("/__stats", self.stats)
+        return app
+
+    @web.middleware
+    async def _inject(self, request: web.Request, handler):
+        if request.path == "/__stats":
+            return await handler(request)
+        resource = request.match_info.route.resource
+        self.requests[resource.canonical if resource else request.path] += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.error_rate:
+            return web.Response(status=self._rng.choice([500, 502, 503, 429]), text="injected error")
+        return await handler(request)
+
+    def _recipe(self, request: web.Request) -> dict:
+        try:
+            recipe_id = int(request.match_info["id"])
+        except ValueError:
+            raise web.HTTPNotFound(text="recipe not found")
+        return make_recipe(recipe_id)
+
+    async def find_by_ingredients(self, request: web.Request) -> web.Response:
+        wanted = {i.strip().lower() for i in request.query.get("ingredients", "").split(",") if i.strip()}
+        number = int(request.query.get("number", 10))
+        results = []
+        for recipe_id in range(1, self.corpus_size + 1):
+            recipe = make_recipe(recipe_id)
+            used = [i for i in recipe["extendedIngredients"] if i["name"] in wanted]
+            if not used:
+                continue
+            missed = [i for i in recipe["extendedIngredients"] if i["name"] not in wanted]
+            results.append({
+                "id": recipe_id, "title": recipe["title"], "image": recipe["image"], "imageType": "jpg",
+                "usedIngredientCount": len(used), "missedIngredientCount": len(missed),
+                "usedIngredients": used, "missedIngredients": missed, "unusedIngredients": [], "likes": recipe_id % 50,
+            })
+        results.sort(key=lambda r: (-r["usedIngredientCount"], r["missedIngredientCount"]))
+        return web.json_response(results[:number])
+
+    async def complex_search(self, request: web.Request) -> web.Response:
+        def listed(name: str) -> set[str]:
+            return {i.strip().lower() for i in request.query.get(name, "").split(",") if i.strip()}
+
+        wanted, excluded, diets = listed("includeIngredients"), listed("excludeIngredients"), listed("diet")
+        number = int(request.query.get("number", 10))
+        results = []
+        for recipe_id in range(1, self.corpus_size + 1):
+            recipe = make_recipe(recipe_id)
+            names = {i["name"] for i in recipe["extendedIngredients"]}
+            if not names & wanted or names & excluded or not diets <= set(recipe["diets"]):
+                continue
+            used = [i for i in recipe["extendedIngredients"] if i["name"] in wanted]
+            missed = [i for i in recipe["extendedIngredients"] if i["name"] not in wanted]
+            results.append({
+                **{k: recipe[k] for k in ("id", "title", "image", "imageType", "readyInMinutes", "servings", "cuisines", "diets")},
+                "usedIngredientCount": len(used), "missedIngredientCount": len(missed),
+                "usedIngredients": used, "missedIngredients": missed, "unusedIngredients": [],
+            })
+        results.sort(key=lambda r: (-r["usedIngredientCount"], r["missedIngredientCount"]))
+        return web.json_response({"results": results[:number], "offset": 0, "number": number, "totalResults": len(results)})
+
+    async def information_bulk(self, request: web.Request) -> web.Response:
+        ids = [int(i) for i in request.query.get("ids", "").split(",") if i.strip().isdigit()]
+        return web.json_response([make_recipe(i) for i in ids])
+
+    async def similar(self, request: web.Request) -> web.Response:
+        recipe = self._recipe(request)
+        rng = random.Random(recipe["id"] * 13)
+        number = int(request.query.get("number", 10))
+        return web.json_response([
+            {"id": r["id"], "title": r["title"], "imageType": "jpg", "readyInMinutes": r["readyInMinutes"],
+             "servings": r["servings"], "sourceUrl": f"https://example.com/{r['id']}"}
+            for r in (make_recipe(rng.randint(1, self.corpus_size)) for _ in range(number))
+        ])
+
+    async def summary(self, request: web.Request) -> web.Response:
+        recipe = self._recipe(request)
+        return web.json_response({"id": recipe["id"], "title": recipe["title"], "summary": recipe["summary"]})
+
+    async def analyzed_instructions(self, request: web.Request) -> web.Response:
+        return web.json_response(make_instructions(self._recipe(request)))
+
+    async def ingredient_search(self, request: web.Request) -> web.Response:
+        query = request.query.get("query", "").strip().lower()
+        matches = [n for n in INGREDIENTS if query and (query in n or n in query)]
+        return web.json_response({
+            "results": [{"id": INGREDIENTS.index(n) + 1, "name": n, "image": f"{n}.jpg"} for n in matches],
+            "offset": 0, "number": 10, "totalResults": len(matches),
+        })
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": dict(self.requests), "total": sum(self.requests.values())})
+
+
+async def start(host: str = "127.0.0.1", port: int = 8089, **options) -> tuple[web.AppRunner, MockSpoonacular]:
+    """Start the mock on the running loop; stop it with ``await runner.cleanup()``."""
+    mock = MockSpoonacular(**options)
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, mock
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="base response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 5xx/429")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    args = parser.parse_args()
+
+    mock = MockSpoonacular(args.latency, args.jitter, args.error_rate, args.corpus_size)
+    web.run_app(mock.app(), host=args.host, port=args.port)
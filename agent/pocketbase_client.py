@@ -0,0 +1,338 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Optional
+import aiohttp
+import asyncio
+import json
+from livekit.agents import utils
+from instrumentation import record_upstream, upstream_request
+
+logger = logging.getLogger("agent-Bruno")
+
+# Direct persistence is off unless a PocketBase URL is configured; the client
+# RPCs are used instead. Writes carry the signed-in user's own token, handed
+# over by the kitchen page, so PocketBase's access rules still apply.
+POCKETBASE_URL = os.getenv("POCKETBASE_URL", "")
+REQUEST_TIMEOUT = 5.0
+
+
+class PocketBaseError(Exception):
+    def __init__(self, status: int, body: str) -> None:
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+def record_id(*parts: Any) -> str:
+    """Deterministic 15 character record id, used as an idempotency key for creates.
+
+    A retried create collides with the record the first attempt made instead
+    of adding a duplicate.
+    """
+    return hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:15]
+
+
+def _split(value: Any, lower: bool = False) -> list[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    items = [str(v).strip() for v in value or [] if str(v).strip()]
+    return [v.lower() for v in items] if lower else items
+
+
+def _union(current: Any, added: Any) -> list[str]:
+    merged = list(current or [])
+    merged += [v for v in _split(added, lower=True) if v not in merged]
+    return merged
+
+
+class PocketBaseClient:
+    """PocketBase client shared by every session in a worker process.
+
+    Holds no credentials of its own: every request is made with the token of
+    the user whose session it belongs to.
+    """
+
+    def __init__(self, base_url: str = POCKETBASE_URL, http_session: Optional[aiohttp.ClientSession] = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self._http_session = http_session
+        # Cleared the first time the server rejects /api/batch (it is opt-in
+        # in the PocketBase settings); writes are then sent one by one.
+        self.batch_enabled = True
+        self.requests = 0
+        self.batches = 0
+        self.failed = 0
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http_session is not None:
+            return self._http_session
+        return utils.http_context.http_session()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed": self.failed,
+            "batch_enabled": self.batch_enabled,
+        }
+
+    async def _send(self, method: str, path: str, body: Any = None, params: Optional[dict] = None, token: Optional[str] = None) -> Any:
+        headers = {"Authorization": token} if token else {}
+        endpoint = path.split("/records")[0]
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            with upstream_request("pocketbase"):
+                async with self._session().request(
+                    method,
+                    f"{self.base_url}{path}",
+                    json=body,
+                    params=params,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                ) as resp:
+                    text = await resp.text()
+                    status = resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            record_upstream("pocketbase", endpoint, "error", time.perf_counter() - started)
+            self.failed += 1
+            raise PocketBaseError(0, str(e)) from e
+        record_upstream("pocketbase", endpoint, status, time.perf_counter() - started)
+
+        if status >= 400:
+            self.failed += 1
+            raise PocketBaseError(status, text)
+        return json.loads(text) if text else None
+
+    async def request(self, method: str, path: str, token: str, body: Any = None, params: Optional[dict] = None) -> Any:
+        """Send a request as the user ``token`` belongs to."""
+        return await self._send(method, path, body, params, token)
+
+    async def auth_refresh(self, token: str) -> dict:
+        """Check a user token with PocketBase; returns ``{"token", "record"}`` with a fresh token."""
+        return await self._send("POST", "/api/collections/users/auth-refresh", token=token)
+
+    async def first(self, collection: str, filter_: str, token: str, sort: str = "-updated") -> Optional[dict]:
+        data = await self.request(
+            "GET",
+            f"/api/collections/{collection}/records",
+            token,
+            params={"filter": filter_, "sort": sort, "perPage": 1, "skipTotal": 1},
+        )
+        items = (data or {}).get("items") or []
+        return items[0] if items else None
+
+    async def batch(self, requests: list[dict], token: str) -> list[bool]:
+        """Run record writes as one transactional /api/batch call.
+
+        Each request is ``{"method", "url", "body"}``. Returns whether each
+        write was applied. If the batch as a whole is rejected, the writes are
+        retried individually so one bad write doesn't sink the others.
+        """
+
+        if len(requests) > 1 and self.batch_enabled:
+            try:
+                await self.request("POST", "/api/batch", token, {"requests": requests})
+                self.batches += 1
+                return [True] * len(requests)
+            except PocketBaseError as e:
+                if e.status in (403, 404):
+                    logger.info("PocketBase batch API unavailable, sending writes individually: %s", e)
+                    self.batch_enabled = False
+                elif e.status != 400:
+                    return [False] * len(requests)
+
+        results = []
+        for r in requests:
+            try:
+                await self.request(r["method"], r["url"], token, r.get("body"))
+                results.append(True)
+            except PocketBaseError as e:
+                logger.warning("PocketBase %s %s failed: %s", r["method"], r["url"], e)
+                results.append(False)
+        return results
+
+
+class SessionPersistence:
+    """Writes one session's client persistence calls straight to PocketBase.
+
+    Accepts the same method names and payloads as the browser's RPC handlers
+    and maps them onto ``cooking_sessions``, ``user_preferences`` and
+    ``favorite_recipes`` records, matching what the kitchen page would have
+    written. Everything is written with the user's own token, so a session
+    can only touch that user's records.
+    """
+
+    def __init__(self, client: PocketBaseClient, token: str, user_id: str, session_record_id: str) -> None:
+        self.client = client
+        self.token = token
+        self.user_id = user_id
+        self.session_record_id = session_record_id
+        self._preferences: Optional[dict] = None
+        self._favorites: set[int] = set()
+
+    @classmethod
+    async def connect(cls, client: PocketBaseClient, token: str, session_record_id: str) -> "SessionPersistence":
+        """Persistence for the user ``token`` belongs to, on the cooking session record the page opened.
+
+        The user comes from PocketBase's answer to the token, never from
+        anything the client names itself, and the session record has to be
+        one that user can see.
+        """
+
+        auth = await client.auth_refresh(token)
+        token, user_id = auth["token"], auth["record"]["id"]
+        record = await client.request("GET", f"/api/collections/cooking_sessions/records/{session_record_id}", token)
+        if record.get("user") != user_id:
+            raise PocketBaseError(403, "the cooking session belongs to another user")
+        return cls(client, token, user_id, session_record_id)
+
+    async def _session_update(self, payload: dict) -> dict:
+        body = {}
+        if "recipe_id" in payload:
+            body["selected_recipe_id"] = payload["recipe_id"]
+        if "ingredients" in payload:
+            body["ingredients"] = _split(payload["ingredients"])
+        if "current_step" in payload:
+            body["current_step"] = int(payload["current_step"])
+        for field in ("recipe_name", "recipe_data", "current_phase"):
+            if field in payload:
+                body[field] = payload[field]
+        return {"method": "PATCH", "url": f"/api/collections/cooking_sessions/records/{self.session_record_id}", "body": body}
+
+    async def _preferences_update(self, payload: dict) -> dict:
+        if self._preferences is None:
+            self._preferences = await self.client.first(
+                "user_preferences", f'user = "{self.user_id}"', self.token
+            ) or {}
+
+        current = self._preferences
+        body = {}
+        for field in ("dietary_restrictions", "disliked_ingredients", "favorite_cuisines"):
+            if payload.get(field):
+                body[field] = _union(current.get(field), payload[field])
+        if payload.get("notes"):
+            body["notes"] = payload["notes"].strip()
+        current.update(body)
+
+        if current.get("id"):
+            return {"method": "PATCH", "url": f"/api/collections/user_preferences/records/{current['id']}", "body": body}
+        current["id"] = record_id("user_preferences", self.user_id)
+        return {
+            "method": "POST",
+            "url": "/api/collections/user_preferences/records",
+            "body": {"id": current["id"], "user": self.user_id, **body},
+        }
+
+    async def _favorite_add(self, payload: dict) -> Optional[dict]:
+        recipe_id = int(payload["recipe_id"])
+        favorite_id = record_id("favorite_recipes", self.user_id, recipe_id)
+        rating = int(payload["rating"]) if payload.get("rating") is not None else None
+
+        if recipe_id not in self._favorites:
+            existing = await self.client.first(
+                "favorite_recipes", f'user = "{self.user_id}" && recipe_id = {recipe_id}', self.token
+            )
+            if existing is None:
+                self._favorites.add(recipe_id)
+                return {
+                    "method": "POST",
+                    "url": "/api/collections/favorite_recipes/records",
+                    "body": {
+                        "id": favorite_id,
+                        "user": self.user_id,
+                        "recipe_id": recipe_id,
+                        "recipe_name": payload["recipe_name"],
+                        "recipe_image": payload.get("recipe_image"),
+                        "rating": rating,
+                        "description": payload.get("description"),
+                        "ingredients": _split(payload.get("ingredients")) or None,
+                    },
+                }
+            favorite_id = existing["id"]
+            self._favorites.add(recipe_id)
+
+        if rating is None:
+            return None
+        return {"method": "PATCH", "url": f"/api/collections/favorite_recipes/records/{favorite_id}", "body": {"rating": rating}}
+
+    async def append_transcript(self, job_id: str, seq: int, turns: list[dict]) -> bool:
+        """Store one transcript chunk; a retried chunk lands on the same record."""
+        session_id = self.session_record_id
+        try:
+            await self.client.request("POST", "/api/collections/transcript_chunks/records", self.token, {
+                "id": record_id("transcript_chunks", session_id, job_id, seq),
+                "session": session_id,
+                "job": job_id,
+                "seq": seq,
+                "messages": turns,
+            })
+        except PocketBaseError as e:
+            # The first attempt made it even though its response didn't.
+            if "validation_not_unique" in e.body:
+                return True
+            logger.warning("could not store transcript chunk %d: %s", seq, e)
+            return False
+        return True
+
+    async def write_transcript(self, turns: list[dict]) -> bool:
+        try:
+            await self.client.request(
+                "PATCH", f"/api/collections/cooking_sessions/records/{self.session_record_id}", self.token,
+                {"transcript": turns},
+            )
+        except PocketBaseError as e:
+            logger.warning("could not store transcript: %s", e)
+            return False
+        return True
+
+    async def persist_many(self, writes: list[tuple[str, dict]]) -> list[bool]:
+        """Persist ``(method, payload)`` writes in one batch; returns which ones succeeded.
+
+        Writes that fail, or that can't be mapped, come back False so the
+        caller can fall back to the client RPC.
+        """
+
+        builders = {
+            "update_cooking_session": self._session_update,
+            "update_user_preferences": self._preferences_update,
+            "add_to_favorites": self._favorite_add,
+        }
+        results = [False] * len(writes)
+        requests, positions = [], []
+        for i, (method, payload) in enumerate(writes):
+            builder = builders.get(method)
+            if builder is None:
+                continue
+            try:
+                request = await builder(payload)
+            except (PocketBaseError, KeyError, TypeError, ValueError) as e:
+                logger.warning("could not prepare %s for PocketBase: %s", method, e)
+                continue
+            if request is None:
+                # Nothing to write, e.g. an already saved favorite.
+                results[i] = True
+                continue
+            requests.append(request)
+            positions.append(i)
+
+        if requests:
+            for i, ok in zip(positions, await self.client.batch(requests, self.token)):
+                results[i] = ok
+        if not all(results):
+            # Lookups may be stale after a failure; refresh them next time.
+            self._preferences = None
+            self._favorites.clear()
+        return results
+
+
+_client: Optional[PocketBaseClient] = None
+
+
+def get_pocketbase() -> Optional[PocketBaseClient]:
+    """Return the process-wide client, or None when direct persistence isn't configured."""
+    global _client
+    if _client is None and POCKETBASE_URL:
+        _client = PocketBaseClient()
+    return _client
@@ -0,0 +1,199 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from recipe_index import ingredient_key
+
+logger = logging.getLogger("agent-Bruno")
+
+# Free-text restrictions, as users say them, mapped to complexSearch's diet
+# and intolerance values.
+DIETS = {
+    "vegetarian": "vegetarian",
+    "veggie": "vegetarian",
+    "vegan": "vegan",
+    "pescatarian": "pescetarian",
+    "pescetarian": "pescetarian",
+    "keto": "ketogenic",
+    "ketogenic": "ketogenic",
+    "paleo": "paleo",
+    "primal": "primal",
+    "whole30": "whole30",
+}
+INTOLERANCES = {
+    "dairy free": "dairy",
+    "lactose intolerant": "dairy",
+    "no dairy": "dairy",
+    "egg free": "egg",
+    "nut free": "tree nut",
+    "nut allergy": "tree nut",
+    "tree nut allergy": "tree nut",
+    "peanut allergy": "peanut",
+    "shellfish allergy": "shellfish",
+    "seafood allergy": "seafood",
+    "soy free": "soy",
+    "sesame allergy": "sesame",
+    "gluten free": "gluten",
+    "celiac": "gluten",
+    "wheat free": "wheat",
+}
+
+_MEAT = {
+    "chicken", "beef", "pork", "bacon", "ham", "sausage", "turkey", "lamb", "veal", "duck",
+    "prosciutto", "pancetta", "chorizo", "salami", "pepperoni", "steak", "ground beef", "gelatin",
+}
+_FISH = {"fish", "salmon", "tuna", "cod", "tilapia", "anchovy", "sardine", "halibut", "trout"}
+_SHELLFISH = {"shrimp", "prawn", "crab", "lobster", "scallop", "clam", "mussel", "oyster"}
+_DAIRY = {
+    "milk", "butter", "cheese", "cream", "yogurt", "parmesan", "cheddar", "mozzarella",
+    "ricotta", "feta", "ghee", "buttermilk", "sour cream", "cream cheese",
+}
+_GLUTEN = {"flour", "pasta", "bread", "breadcrumb", "spaghetti", "noodle", "couscous", "barley", "tortilla", "soy sauce"}
+_NUTS = {"almond", "walnut", "pecan", "cashew", "pistachio", "hazelnut", "macadamia"}
+
+# Ingredient words that rule a recipe out locally, for recipes that don't
+# carry Spoonacular's own diet labels.
+EXCLUDED = {
+    "vegetarian": _MEAT | _FISH | _SHELLFISH,
+    "vegan": _MEAT | _FISH | _SHELLFISH | _DAIRY | {"egg", "honey"},
+    "pescetarian": _MEAT,
+    "dairy": _DAIRY,
+    "egg": {"egg"},
+    "gluten": _GLUTEN,
+    "wheat": _GLUTEN,
+    "tree nut": _NUTS,
+    "peanut": {"peanut", "peanut butter"},
+    "shellfish": _SHELLFISH,
+    "seafood": _FISH | _SHELLFISH,
+    "soy": {"soy sauce", "tofu", "soybean", "edamame", "miso"},
+    "sesame": {"sesame", "tahini"},
+}
+
+
+# Ingredients named after something they aren't, mapped to what they are
+# made of: plant milks and butters, gluten-free flours, butter beans. Only
+# the mapped words are checked, so almond flour is still a tree nut but
+# neither gluten nor dairy.
+_COMPOUNDS = {
+    "peanut butter": "peanut", "almond butter": "almond", "cocoa butter": "cocoa",
+    "almond milk": "almond", "oat milk": "oat", "soy milk": "soy", "rice milk": "rice",
+    "coconut milk": "coconut", "coconut cream": "coconut",
+    "almond flour": "almond", "rice flour": "rice", "coconut flour": "coconut",
+    "chickpea flour": "chickpea", "corn flour": "corn", "tapioca flour": "tapioca",
+    "potato flour": "potato", "buckwheat flour": "buckwheat", "rice noodle": "rice",
+    "cream of tartar": "tartar", "butter bean": "bean",
+}
+
+# Recipe-level flags and diet labels that settle a check without looking at
+# ingredients. Real Spoonacular recipes carry the booleans; labels like
+# "lacto ovo vegetarian" come from their ``diets`` list.
+_FLAGS = {"vegetarian": "vegetarian", "vegan": "vegan", "gluten": "glutenFree", "dairy": "dairyFree"}
+_LABELS = {
+    "vegetarian": {"vegetarian", "lacto ovo vegetarian", "vegan"},
+    "vegan": {"vegan"},
+    "gluten": {"gluten free"},
+    "dairy": {"dairy free", "vegan"},
+}
+
+
+def _split(value: Any) -> list[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    return [" ".join(str(v).replace("-", " ").lower().split()) for v in value or [] if str(v).strip()]
+
+
+def _matches(key: str, words: set[str]) -> bool:
+    # "chicken breast" is chicken; "peanut butter" is peanut, not butter.
+    if key in words:
+        return True
+    tokens = set(_COMPOUNDS.get(key, key).split())
+    return any(set(w.split()) <= tokens for w in words)
+
+
+def _settled(recipe: dict, check: str) -> Optional[bool]:
+    """Whether the recipe says it meets ``check``, or None if it doesn't say."""
+    flag = recipe.get(_FLAGS.get(check, ""))
+    if isinstance(flag, bool):
+        return flag
+    labels = recipe.get("diets")
+    if check in _LABELS and isinstance(labels, list):
+        return bool(_LABELS[check] & {str(d).lower() for d in labels}) or None
+    return None
+
+
+@dataclass
+class Preferences:
+    """The session's user_preferences, in the form recipe search needs them."""
+
+    dietary_restrictions: list[str] = field(default_factory=list)
+    disliked_ingredients: list[str] = field(default_factory=list)
+    favorite_cuisines: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "Preferences":
+        data = data if isinstance(data, dict) else {}
+        prefs = cls()
+        prefs.update(data.get("dietary_restrictions"), data.get("disliked_ingredients"), data.get("favorite_cuisines"))
+        return prefs
+
+    def update(self, dietary_restrictions: Any = None, disliked_ingredients: Any = None, favorite_cuisines: Any = None) -> None:
+        """Merge new values in, the way the kitchen page merges them before saving."""
+        for current, value in (
+            (self.dietary_restrictions, dietary_restrictions),
+            (self.disliked_ingredients, disliked_ingredients),
+            (self.favorite_cuisines, favorite_cuisines),
+        ):
+            current += [v for v in _split(value) if v not in current]
+
+    def __bool__(self) -> bool:
+        return bool(self.dietary_restrictions or self.disliked_ingredients or self.favorite_cuisines)
+
+    @property
+    def filters(self) -> bool:
+        """Whether anything here rules recipes out, rather than only ranking them."""
+        return bool(self.diets or self.intolerances or self.disliked_ingredients)
+
+    @property
+    def diets(self) -> list[str]:
+        return sorted({DIETS[r] for r in self.dietary_restrictions if r in DIETS})
+
+    @property
+    def intolerances(self) -> list[str]:
+        return sorted({INTOLERANCES[r] for r in self.dietary_restrictions if r in INTOLERANCES})
+
+    def complex_search_params(self) -> dict:
+        """Filters for /recipes/complexSearch. Favorite cuisines only rank, they never filter."""
+        params = {}
+        if self.diets:
+            params["diet"] = ",".join(self.diets)
+        if self.intolerances:
+            params["intolerances"] = ",".join(self.intolerances)
+        if self.disliked_ingredients:
+            params["excludeIngredients"] = ",".join(self.disliked_ingredients)
+        return params
+
+    def violations(self, recipe: dict, ingredient_names: list[str]) -> list[str]:
+        """What makes a recipe unsuitable for this user; empty if it fits.
+
+        Args:
+            recipe: The recipe or search result, for its diet flags and labels.
+            ingredient_names: Every ingredient of the recipe, pantry staples included.
+        """
+
+        found, excluded = [], set()
+        for check in self.diets + self.intolerances:
+            settled = _settled(recipe, check)
+            if settled is False:
+                found.append(f"not {check}" if check in self.diets else f"contains {check}")
+            elif settled is None:
+                excluded |= EXCLUDED.get(check, set())
+        disliked = {ingredient_key(d) for d in self.disliked_ingredients}
+
+        for name in ingredient_names:
+            key = ingredient_key(name)
+            if key and (_matches(key, excluded) or _matches(key, disliked)):
+                found.append(name)
+        return found
+
+    def rank(self, recipe: dict) -> int:
+        """1 for a recipe from one of the user's favorite cuisines, else 0."""
+        return int(any(str(c).lower() in self.favorite_cuisines for c in recipe.get("cuisines") or []))
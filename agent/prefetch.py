@@ -0,0 +1,72 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Optional
+from urllib.parse import quote
+from spoonacular import SpoonacularClient
+
+logger = logging.getLogger("agent-Bruno")
+
+PREFETCH_TOP_N = int(os.getenv("MISE_PREFETCH_TOP_N", "3"))
+# Shared by every session in the process so a burst of searches can't turn
+# into a burst of upstream requests.
+PREFETCH_CONCURRENCY = int(os.getenv("MISE_PREFETCH_CONCURRENCY", "4"))
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _prefetch_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+    return _semaphore
+
+
+def recipe_ids(results: Any) -> list[str]:
+    """Pull recipe ids, in order, out of a search/similar response or result list."""
+    if isinstance(results, str):
+        try:
+            results = json.loads(results)
+        except ValueError:
+            return []
+    if not isinstance(results, list):
+        return []
+    return [str(r["id"]) for r in results if isinstance(r, dict) and r.get("id") is not None]
+
+
+class InstructionPrefetcher:
+    """Warms analyzedInstructions for the top candidates while the user is choosing.
+
+    Prefetches only fill the shared client cache; failures are logged and
+    otherwise ignored. Call ``aclose`` when the session ends to cancel anything
+    still running.
+    """
+
+    def __init__(self, client: SpoonacularClient, top_n: int = PREFETCH_TOP_N) -> None:
+        self.client = client
+        self.top_n = top_n
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    def schedule(self, results: Any) -> None:
+        if self._closed:
+            return
+        for id_ in recipe_ids(results)[: self.top_n]:
+            task = asyncio.create_task(self._prefetch(id_))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch(self, id_: str) -> None:
+        async with _prefetch_semaphore():
+            try:
+                await self.client.get(f"/recipes/{quote(id_, safe='')}/analyzedInstructions")
+            except Exception as e:
+                logger.debug("prefetch of recipe %s instructions failed: %s", id_, e)
+
+    async def aclose(self) -> None:
+        self._closed = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
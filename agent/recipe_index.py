@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Optional
+import numpy as np
+from ingredient_index import normalize
+
+logger = logging.getLogger("agent-Bruno")
+
+RECIPE_CORPUS_PATH = os.getenv("MISE_RECIPE_CORPUS", "")
+# Fewer local matches than this and the search falls back to Spoonacular.
+MIN_LOCAL_RESULTS = int(os.getenv("MISE_RECIPE_CORPUS_MIN_RESULTS", "3"))
+
+# Mirrors findByIngredients' ignorePantry=true: these never count as used or missed.
+PANTRY_STAPLES = {
+    "water", "ice", "salt", "pepper", "black pepper", "salt and pepper", "kosher salt",
+    "sea salt", "flour", "all purpose flour", "sugar", "granulated sugar", "oil",
+    "olive oil", "vegetable oil", "cooking oil", "baking powder", "baking soda",
+}
+
+
+def ingredient_key(name: str) -> str:
+    """Normalize an ingredient name and crudely singularize its last word."""
+    words = normalize(name).split()
+    if not words:
+        return ""
+    last = words[-1]
+    if last.endswith("oes"):
+        last = last[:-2]
+    elif last.endswith("ies") and len(last) > 4:
+        last = last[:-3] + "y"
+    elif last.endswith("s") and not last.endswith("ss") and len(last) > 3:
+        last = last[:-1]
+    return " ".join(words[:-1] + [last])
+
+
+_PANTRY_KEYS = {ingredient_key(n) for n in PANTRY_STAPLES}
+# Words that describe an ingredient without making it a different one, so
+# "red onion" is still onion. Nouns are left out on purpose: peanut butter
+# is not butter and chicken broth is not chicken.
+MODIFIERS = {
+    "red", "green", "yellow", "white", "black", "brown", "purple", "orange",
+    "fresh", "dried", "frozen", "raw", "ripe", "organic", "whole", "large",
+    "medium", "small", "baby", "sweet", "chopped", "diced", "sliced", "minced",
+    "grated", "shredded", "boneless", "skinless", "lean", "unsalted", "salted",
+}
+
+
+def same_ingredient(a: str, b: str) -> bool:
+    """Whether ingredient keys ``a`` and ``b`` name the same ingredient.
+
+    Besides equal keys, a bare noun matches the same noun with only
+    MODIFIERS in front, in either direction: "onion" and "red onion" match,
+    "butter" and "peanut butter" don't.
+    """
+    if a == b:
+        return True
+    if not a or not b:
+        return False
+    *a_words, a_noun = a.split()
+    *b_words, b_noun = b.split()
+    if a_noun != b_noun or (a_words and b_words):
+        return False
+    return set(a_words or b_words) <= MODIFIERS
+
+
+def recipe_ingredients(recipe: dict) -> list[dict]:
+    """Return a recipe's ingredients as ``{"name", "amount", "unit"}`` dicts."""
+    raw = recipe.get("extendedIngredients") or recipe.get("ingredients") or []
+    items = []
+    for item in raw:
+        if isinstance(item, str):
+            item = {"name": item}
+        elif not isinstance(item, dict):
+            continue
+        name = item.get("nameClean") or item.get("name")
+        if name:
+            items.append({"name": name, "amount": item.get("amount"), "unit": item.get("unit")})
+    return items
+
+
+class RecipeIndex:
+    """In-memory recipe corpus with an ingredient -> recipe inverted index.
+
+    Scoring follows findByIngredients with ranking=1 and ignorePantry=true:
+    recipes with the most ingredients matched by the given ones come first,
+    ties broken by fewest missing ingredients, and pantry staples are ignored
+    on both sides.
+    Counting is done with NumPy over the posting lists so a query stays a few
+    vectorized passes regardless of corpus size.
+    """
+
+    def __init__(self, recipes: list[dict]) -> None:
+        self.recipes: list[dict] = []
+        self._ids: dict[int, int] = {}
+        self._keys: list[list[str]] = []
+        vocab: dict[str, int] = {}
+        postings: dict[int, list[int]] = defaultdict(list)
+
+        for recipe in recipes:
+            if recipe.get("id") is None or recipe["id"] in self._ids:
+                continue
+            row = len(self.recipes)
+            keys = []
+            for item in recipe_ingredients(recipe):
+                key = ingredient_key(item["name"])
+                if not key or key in _PANTRY_KEYS or key in keys:
+                    continue
+                keys.append(key)
+                postings[vocab.setdefault(key, len(vocab))].append(row)
+            self._ids[recipe["id"]] = row
+            self._keys.append(keys)
+            self.recipes.append(recipe)
+
+        self._vocab = vocab
+        self._postings = [np.asarray(postings[col], dtype=np.int32) for col in range(len(vocab))]
+        self._sizes = np.asarray([len(k) for k in self._keys], dtype=np.int32)
+        # Last word -> ingredient columns, the candidates for same_ingredient.
+        self._nouns: dict[str, list[int]] = defaultdict(list)
+        for key, col in vocab.items():
+            self._nouns[key.split()[-1]].append(col)
+        self._col_keys = list(vocab)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    @classmethod
+    def load(cls, path: str) -> "RecipeIndex":
+        """Load a corpus from a JSON array or a JSONL file of Spoonacular-style recipes."""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                recipes = [json.loads(line) for line in f if line.strip()]
+            else:
+                recipes = json.load(f)
+        return cls(recipes)
+
+    def get(self, recipe_id: int) -> Optional[dict]:
+        row = self._ids.get(recipe_id)
+        return self.recipes[row] if row is not None else None
+
+    def _columns(self, key: str) -> list[int]:
+        """Ingredient columns naming the same ingredient as ``key``."""
+        return [c for c in self._nouns.get(key.split()[-1], ()) if same_ingredient(key, self._col_keys[c])]
+
+    def find_by_ingredients(self, ingredients: list[str], number: int = 10) -> list[dict]:
+        """Return up to ``number`` recipes shaped like findByIngredients results."""
+        query = {k for k in (ingredient_key(i) for i in ingredients) if k and k not in _PANTRY_KEYS}
+        if not query or not self.recipes:
+            return []
+
+        # Every count and list below comes from this one set of matched
+        # ingredient columns, so usedIngredientCount is len(usedIngredients).
+        cols = set().union(*(self._columns(key) for key in query))
+        if not cols:
+            return []
+
+        used = np.bincount(np.concatenate([self._postings[c] for c in cols]), minlength=len(self.recipes))
+        candidates = np.flatnonzero(used)
+        missed = self._sizes[candidates] - used[candidates]
+        order = np.lexsort((missed, -used[candidates]))[:number]
+
+        results = []
+        for row in candidates[order]:
+            recipe = self.recipes[row]
+            used_items, missed_items, seen = [], [], set()
+            for item in recipe_ingredients(recipe):
+                key = ingredient_key(item["name"])
+                if not key or key in _PANTRY_KEYS or key in seen:
+                    continue
+                seen.add(key)
+                (used_items if self._vocab[key] in cols else missed_items).append(item)
+            results.append({
+                "id": recipe["id"],
+                "title": recipe.get("title"),
+                "image": recipe.get("image"),
+                "usedIngredientCount": len(used_items),
+                "missedIngredientCount": len(missed_items),
+                "usedIngredients": used_items,
+                "missedIngredients": missed_items,
+            })
+        return results
+
+
+_recipe_index: Optional[RecipeIndex] = None
+_load_attempted = False
+
+
+def get_recipe_index() -> Optional[RecipeIndex]:
+    """Return the process-wide recipe index, or None when no corpus is configured."""
+    global _recipe_index, _load_attempted
+    if not _load_attempted and RECIPE_CORPUS_PATH:
+        _load_attempted = True
+        try:
+            _recipe_index = RecipeIndex.load(RECIPE_CORPUS_PATH)
+            logger.info("loaded %d recipes from %s", len(_recipe_index), RECIPE_CORPUS_PATH)
+        except (OSError, ValueError) as e:
+            logger.warning("could not load recipe corpus %s: %s", RECIPE_CORPUS_PATH, e)
+    return _recipe_index
@@ -0,0 +1,202 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger("agent-Bruno")
+
+RECIPE_STORE_PATH = os.getenv(
+    "MISE_RECIPE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "recipes.sqlite3"),
+)
+RECIPE_STORE_MAX_MB = float(os.getenv("MISE_RECIPE_STORE_MAX_MB", "256"))
+
+# Expired rows are kept this long so they can still be served while
+# Spoonacular is down.
+STALE_GRACE = 7 * 24 * 3600.0
+
+# Calls run on the event loop, so a locked database fails fast instead of
+# stalling every session; a missed read is a cache miss, a missed write is
+# retried the next time the response is fetched.
+BUSY_TIMEOUT = 0.05
+# Read times only order eviction, so they are written in batches rather
+# than with an UPDATE on every hit.
+ACCESS_FLUSH_ROWS = 64
+ACCESS_FLUSH_INTERVAL = 30.0
+
+# Endpoints worth keeping across worker restarts, and for how long. Anything
+# not listed here only lives in the in-memory cache.
+PERSISTED_TTLS = {
+    "analyzedInstructions": 30 * 24 * 3600.0,
+    "summary": 30 * 24 * 3600.0,
+    "similar": 7 * 24 * 3600.0,
+    "ingredients/search": 7 * 24 * 3600.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class RecipeStore:
+    """SQLite-backed response store shared by every worker process on a host.
+
+    The database runs in WAL mode so concurrent readers in other job processes
+    never block on a writer. Entries expire per endpoint and the file is kept
+    under ``max_bytes`` by evicting the least recently read responses. Read
+    times are buffered and written in batches, so a hit is a single SELECT.
+    """
+
+    def __init__(self, path: str = RECIPE_STORE_PATH, max_bytes: Optional[int] = None) -> None:
+        self.path = path
+        self.max_bytes = max_bytes if max_bytes is not None else int(RECIPE_STORE_MAX_MB * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_trim = 0
+        self._accessed: dict[str, float] = {}
+        self._accessed_flushed = time.monotonic()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def persists(endpoint: str) -> bool:
+        return endpoint in PERSISTED_TTLS
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        """Return ``(body, seconds_until_expiry)`` for a fresh entry, or None."""
+        now = time.time()
+        try:
+            row = self._db.execute(
+                "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+        except sqlite3.Error as e:
+            logger.warning("recipe store read failed: %s", e)
+            return None
+        self.hits += 1
+        self._accessed[key] = now
+        if len(self._accessed) >= ACCESS_FLUSH_ROWS or time.monotonic() - self._accessed_flushed >= ACCESS_FLUSH_INTERVAL:
+            self.flush_access_times()
+        return row[0], row[1] - now
+
+    def flush_access_times(self) -> None:
+        """Write buffered read times in one statement; on failure they are dropped."""
+        accessed, self._accessed = self._accessed, {}
+        self._accessed_flushed = time.monotonic()
+        if not accessed:
+            return
+        try:
+            self._db.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", [(t, k) for k, t in accessed.items()]
+            )
+        except sqlite3.Error as e:
+            logger.debug("recipe store access times not written: %s", e)
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Return the stored body for ``key`` even if it has expired."""
+        try:
+            row = self._db.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("recipe store read failed: %s", e)
+            return None
+        return row[0] if row is not None else None
+
+    def set(self, key: str, endpoint: str, body: str) -> None:
+        ttl = PERSISTED_TTLS.get(endpoint)
+        if ttl is None:
+            return
+        now = time.time()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body.encode()), now + ttl, now),
+            )
+        except sqlite3.Error as e:
+            logger.warning("recipe store write failed: %s", e)
+            return
+        self._writes_since_trim += 1
+        if self._writes_since_trim >= 50:
+            self.trim()
+
+    def trim(self) -> int:
+        """Drop rows past their stale grace, then evict least recently read rows past the size cap."""
+        self._writes_since_trim = 0
+        self.flush_access_times()
+        try:
+            removed = self._db.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time() - STALE_GRACE,)
+            ).rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # Evict down to 90% of the cap so we don't trim on every write.
+                excess = total - int(self.max_bytes * 0.9)
+                rows = self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                )
+                victims = []
+                for key, size in rows:
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+                removed += len(victims)
+        except sqlite3.Error as e:
+            logger.warning("recipe store trim failed: %s", e)
+            return 0
+        return removed
+
+    def recent(self, limit: int) -> list[tuple[str, str, float]]:
+        """Return up to ``limit`` fresh ``(key, body, seconds_until_expiry)`` rows, most recently read first."""
+        now = time.time()
+        try:
+            rows = self._db.execute(
+                "SELECT key, body, expires_at FROM responses WHERE expires_at > ?"
+                " ORDER BY accessed_at DESC LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("recipe store read failed: %s", e)
+            return []
+        return [(key, body, expires_at - now) for key, body, expires_at in rows]
+
+    def bodies(self, endpoint: str, limit: int = 5000) -> list[str]:
+        """Return the fresh response bodies stored for one endpoint."""
+        return [body for _, body in self.entries(endpoint, limit)]
+
+    def entries(self, endpoint: str, limit: int = 5000) -> list[tuple[str, str]]:
+        """Return the fresh ``(key, body)`` rows stored for one endpoint, most recently read first."""
+        try:
+            rows = self._db.execute(
+                "SELECT key, body FROM responses WHERE endpoint = ? AND expires_at > ?"
+                " ORDER BY accessed_at DESC LIMIT ?",
+                (endpoint, time.time(), limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("recipe store read failed: %s", e)
+            return []
+        return [(key, body) for key, body in rows]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self.flush_access_times()
+        self._db.close()
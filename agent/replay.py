@@ -0,0 +1,204 @@
+"""Replay recorded tool traffic against the agent's tool layer.
+
+Reads the JSONL traces sessions write when MISE_TRACE_DIR is set, serves
+their recorded Spoonacular responses from an in-process stand-in and re-runs
+every session's tool calls against a fresh DefaultAgent with a stubbed room.
+Calls keep their recorded spacing divided by --speed (0 runs them back to
+back); calls that overlapped in the recording overlap again.
+
+    python replay.py .cache/traces --speed 10
+    python replay.py .cache/traces/*.jsonl --speed 0 --latency 0
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Optional
+
+from aiohttp import web
+
+from benchmark import Recorder, print_latencies
+
+
+def load_traces(paths: list[str]) -> list[list[dict]]:
+    from traffic import read_trace
+
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path]
+    return [read_trace(f) for f in files]
+
+
+class TraceUpstream:
+    """Answers Spoonacular GETs with the responses recorded in the traces.
+
+    Requests are matched on path and normalized params; repeats of the same
+    request get the recorded responses in order, then the last one again.
+    """
+
+    def __init__(self, traces: list[list[dict]], latency: Optional[float] = None) -> None:
+        from spoonacular import cache_key
+
+        self._key = cache_key
+        self.latency = latency
+        self.responses: dict[str, list[dict]] = defaultdict(list)
+        for trace in traces:
+            for event in trace:
+                if event["ev"] == "upstream" and event.get("service") == "spoonacular":
+                    self.responses[cache_key(event["path"], event.get("params"))].append(event)
+        self.recorded = sum(len(r) for r in self.responses.values())
+        self._served: Counter = Counter()
+        self.unmatched: Counter = Counter()
+
+    @property
+    def served(self) -> int:
+        return sum(self._served.values())
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = {k: v for k, v in request.query.items() if k != "apiKey"}
+        key = self._key(request.path, params)
+        recorded = self.responses.get(key)
+        if not recorded:
+            self.unmatched[request.path] += 1
+            return web.json_response({"message": "not in any trace"}, status=404)
+        event = recorded[min(self._served[key], len(recorded) - 1)]
+        self._served[key] += 1
+        await asyncio.sleep(event.get("ms", 0) / 1000 if self.latency is None else self.latency)
+        status = event["status"] if isinstance(event["status"], int) else 503
+        body = json.dumps(event["json"]) if "json" in event else event.get("text", "")
+        return web.Response(status=status, text=body, content_type="application/json")
+
+
+class StubParticipant:
+    """Stands in for the room's local participant; every client RPC succeeds."""
+
+    def __init__(self) -> None:
+        self.rpcs: Counter = Counter()
+
+    async def perform_rpc(self, *, destination_identity: str, method: str, payload: str, response_timeout: float = 10.0) -> str:
+        self.rpcs[method] += 1
+        return json.dumps({"success": True})
+
+
+async def replay_session(trace: list[dict], recorder: Recorder, speed: float, totals: Counter) -> None:
+    from livekit.agents import llm
+    from agent import DefaultAgent
+    from preferences import Preferences
+    from rpc_writer import RpcWriter
+    from traffic import digest
+
+    agent = DefaultAgent()
+    participant = StubParticipant()
+    agent.rpc_writer = RpcWriter(lambda: participant)
+    context = SimpleNamespace(session=SimpleNamespace(
+        room_io=SimpleNamespace(linked_participant=SimpleNamespace(identity="replay"))
+    ))
+    tools = {t.info.name: t for t in agent.tools if isinstance(t, llm.FunctionTool)}
+
+    # Pair each call with its result to know its recorded end and digest.
+    calls, open_calls = [], defaultdict(list)
+    for event in trace:
+        if event["ev"] == "context":
+            agent.preferences = Preferences.from_dict(event.get("preferences"))
+            agent.cooking_session.current_phase = event.get("phase")
+        elif event["ev"] == "call":
+            calls.append([event, None])
+            open_calls[event["tool"]].append(calls[-1])
+        elif event["ev"] == "result" and open_calls[event["tool"]]:
+            open_calls[event["tool"]].pop(0)[1] = event
+        elif event["ev"] == "rpc":
+            totals["recorded_rpcs"] += 1
+
+    async def run(call: dict, result: Optional[dict]) -> None:
+        tool = tools.get(call["tool"])
+        if tool is None:
+            totals["unknown_tools"] += 1
+            return
+        replayed = await recorder.call(call["tool"], tool, context=context, **call.get("args", {}))
+        if result is not None and result.get("outcome") == "ok":
+            totals["changed_results" if digest(replayed) != result.get("digest") else "same_results"] += 1
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks: list[asyncio.Task] = []
+    previous_end = None
+    try:
+        for call, result in calls:
+            if speed > 0:
+                await asyncio.sleep(max(0.0, started + call["t"] / speed - loop.time()))
+            # A call the model made after the previous one returned waits for it again.
+            if tasks and (speed <= 0 or previous_end is None or call["t"] >= previous_end):
+                await tasks[-1]
+            tasks.append(asyncio.create_task(run(call, result)))
+            previous_end = result["t"] if result is not None else None
+        await asyncio.gather(*tasks)
+    finally:
+        await agent.rpc_writer.aclose()
+        await agent.prefetcher.aclose()
+    writes = agent.rpc_writer.stats()
+    totals["writes"] += writes["sent"] + writes["merged"] + writes["failed"]
+    totals["rpcs"] += sum(participant.rpcs.values())
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["SPOONACULAR_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("MISE_RECIPE_STORE_PATH", args.store)
+    # Replays must not write traces of their own.
+    os.environ["MISE_TRACE_DIR"] = ""
+    from livekit.agents import utils
+    from spoonacular import get_client
+
+    traces = load_traces(args.paths)
+    if not traces:
+        raise SystemExit("no traces found")
+    upstream = TraceUpstream(traces, args.latency)
+    runner = web.AppRunner(upstream.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    recorder = Recorder()
+    totals: Counter = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency or len(traces))
+
+    async def session_slot(trace: list[dict]) -> None:
+        async with semaphore:
+            await replay_session(trace, recorder, args.speed, totals)
+
+    started = time.perf_counter()
+    async with utils.http_context.open():
+        await asyncio.gather(*(session_slot(t) for t in traces))
+    elapsed = time.perf_counter() - started
+
+    print_latencies(recorder, len(traces), elapsed)
+    print(f"upstream requests: {upstream.served} (recorded {upstream.recorded}, "
+          f"{sum(upstream.unmatched.values())} not in any trace)")
+    if upstream.unmatched:
+        print(f"  unmatched: {dict(upstream.unmatched)}")
+    print(f"client writes: {totals['writes']} (recorded {totals['recorded_rpcs']}), sent as {totals['rpcs']} rpcs")
+    print(f"results: {totals['same_results']} same, {totals['changed_results']} changed, "
+          f"{totals['unknown_tools']} calls to unknown tools")
+    print(f"client stats: {json.dumps(get_client().stats())}")
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="trace files or directories of them")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration; 0 replays back to back")
+    parser.add_argument("--latency", type=float, default=None,
+                        help="upstream delay in seconds (default: the recorded latency)")
+    parser.add_argument("--concurrency", type=int, default=0, help="sessions replayed at once (0: all)")
+    parser.add_argument("--port", type=int, default=8091, help="port for the recorded-upstream stand-in")
+    parser.add_argument("--store", default="", help="recipe store path (empty disables the on-disk store)")
+    asyncio.run(main(parser.parse_args()))
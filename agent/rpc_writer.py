@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from livekit import rtc
+from instrumentation import record_rpc
+from pocketbase_client import SessionPersistence
+from traffic import trace_event
+
+logger = logging.getLogger("agent-Bruno")
+
+# Comma-separated fields that the client and PocketBase add to, rather than
+# replace; merged writes keep the values of both.
+UNION_FIELDS = {
+    "update_user_preferences": ("dietary_restrictions", "disliked_ingredients", "favorite_cuisines"),
+}
+
+
+def merge_payloads(method: str, older: dict, newer: dict) -> dict:
+    """``newer`` written over ``older``, with UNION_FIELDS of ``method`` joined instead."""
+    merged = {**older, **newer}
+    for field in UNION_FIELDS.get(method, ()):
+        if older.get(field) and newer.get(field):
+            values = []
+            for value in f"{older[field]},{newer[field]}".split(","):
+                value = value.strip()
+                if value and value.lower() not in (v.lower() for v in values):
+                    values.append(value)
+            merged[field] = ", ".join(values)
+    return merged
+
+
+@dataclass
+class _Write:
+    method: str
+    destination: str
+    payload: dict
+    merge_key: Any = None
+
+
+class RpcWriter:
+    """Per-session outbound queue for client persistence RPCs.
+
+    Tools enqueue a write and return straight away instead of waiting on the
+    browser and PocketBase. Writes go out one at a time, in order, with
+    retries. A pending write is merged into the one before it when both target
+    the same method and merge key, so a burst of step changes becomes a
+    single RPC carrying the latest values; comma-list preference fields are
+    joined rather than replaced. A write that still fails after
+    its retries is kept and merged under the next write with the same key,
+    so its fields go out with that one; whatever is left gets one more try
+    on close.
+
+    With ``persistence`` set, everything queued is written straight to
+    PocketBase in one batch and only the writes that fail there go out as
+    RPCs to the browser.
+    """
+
+    def __init__(
+        self,
+        local_participant: Callable[[], rtc.LocalParticipant],
+        max_attempts: int = 3,
+        response_timeout: float = 10.0,
+        persistence: Optional[SessionPersistence] = None,
+    ) -> None:
+        self._local_participant = local_participant
+        self.persistence = persistence
+        self.max_attempts = max_attempts
+        self.response_timeout = response_timeout
+        self._pending: list[_Write] = []
+        self._unsent: dict[tuple, _Write] = {}
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._final = False
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.direct = 0
+
+    def enqueue(self, method: str, destination: str, payload: dict, merge_key: Any = None) -> None:
+        if self._closed:
+            raise RuntimeError("RpcWriter is closed")
+        trace_event("rpc", method=method, payload=payload)
+
+        last = self._pending[-1] if self._pending else None
+        if last is not None and (last.method, last.destination, last.merge_key) == (method, destination, merge_key):
+            last.payload = merge_payloads(method, last.payload, payload)
+            self.merged += 1
+        else:
+            self._pending.append(_Write(method, destination, dict(payload), merge_key))
+
+        self._idle.clear()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                if self._closed and self._unsent:
+                    self._pending, self._unsent = list(self._unsent.values()), {}
+                    self._final = True
+                    continue
+                self._idle.set()
+                if self._closed:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.persistence is not None:
+                await self._persist()
+                continue
+            write = self._with_unsent(self._pending.pop(0))
+            await self._send(write)
+
+    @staticmethod
+    def _key(write: _Write) -> tuple:
+        return write.method, write.destination, write.merge_key
+
+    def _with_unsent(self, write: _Write) -> _Write:
+        """Fold an earlier failed write with the same key under this one."""
+        unsent = self._unsent.pop(self._key(write), None)
+        if unsent is not None:
+            write.payload = merge_payloads(write.method, unsent.payload, write.payload)
+        return write
+
+    def _keep_unsent(self, write: _Write) -> None:
+        if self._final:
+            logger.error("dropping %s write that could not be delivered: %s", write.method, list(write.payload))
+            return
+        self._unsent[self._key(write)] = write
+
+    async def _persist(self) -> None:
+        writes, self._pending = [self._with_unsent(w) for w in self._pending], []
+        try:
+            results = await self.persistence.persist_many([(w.method, w.payload) for w in writes])
+        except Exception as e:
+            logger.warning("direct persistence failed, falling back to client RPCs: %s", e)
+            results = [False] * len(writes)
+        for write, ok in zip(writes, results):
+            if ok:
+                self.direct += 1
+            else:
+                await self._send(write)
+
+    async def _send(self, write: _Write) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                response = await self._local_participant().perform_rpc(
+                    destination_identity=write.destination,
+                    method=write.method,
+                    payload=json.dumps(write.payload),
+                    response_timeout=self.response_timeout,
+                )
+                if json.loads(response or "{}").get("success", True) is False:
+                    raise RuntimeError(response)
+                record_rpc(write.method, "ok", time.perf_counter() - started)
+                self.sent += 1
+                return
+            except Exception as e:
+                record_rpc(write.method, "error", time.perf_counter() - started)
+                if attempt == self.max_attempts:
+                    self.failed += 1
+                    logger.error("%s RPC failed after %d attempts, keeping it for the next write: %s", write.method, attempt, e)
+                    self._keep_unsent(write)
+                    return
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    async def flush(self) -> None:
+        await self._idle.wait()
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        """Send everything still queued, waiting at most ``timeout`` seconds."""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("dropping %d unsent client writes on shutdown", len(self._pending) + len(self._unsent))
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "direct": self.direct,
+            "merged": self.merged,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "unsent": len(self._unsent),
+        }
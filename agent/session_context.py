@@ -0,0 +1,106 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import asyncio
+import json
+from livekit import rtc
+from instrumentation import record_rpc
+
+logger = logging.getLogger("agent-Bruno")
+
+PRELOAD_TIMEOUT = 5.0
+
+
+@dataclass
+class SessionContext:
+    """What Bruno knows about the user before the first reply.
+
+    Filled from the kitchen page's context RPCs while the agent session is
+    still connecting, so the greeting can be personal without a tool call.
+    """
+
+    user_name: str = ""
+    preferences: dict = field(default_factory=dict)
+    context_summary: str = ""
+    favorites: list[dict] = field(default_factory=list)
+    continuation: Optional[dict] = None
+
+    @property
+    def is_continuation(self) -> bool:
+        return self.continuation is not None
+
+    def prompt(self) -> str:
+        """Render the context as a section appended to the agent's instructions."""
+        lines = ["# This Session"]
+        if self.user_name:
+            lines.append(f"The user's name is {self.user_name}.")
+        if self.context_summary:
+            lines.append(f"What you know about them: {self.context_summary}")
+        if self.favorites:
+            names = ", ".join(f["recipe_name"] for f in self.favorites[:5] if f.get("recipe_name"))
+            lines.append(f"Their favorite recipes include: {names}.")
+
+        c = self.continuation
+        if c:
+            lines.append(
+                f"This is a continuation. They were making {c.get('recipe_name') or 'a recipe'} "
+                f"(recipe_id {c.get('recipe_id')}), phase {c.get('current_phase')}, "
+                f"on step {c.get('current_step') or 1}. The step tools already know the recipe - "
+                "use repeat_step to get the step they were on."
+            )
+            if c.get("transcript_summary"):
+                lines.append(f"Previous conversation:\n{c['transcript_summary']}")
+        return "\n".join(lines)
+
+
+def _from_metadata(metadata: str) -> dict:
+    try:
+        data = json.loads(metadata or "{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) and data.get("type") == "user_context" else {}
+
+
+async def _rpc(local: rtc.LocalParticipant, destination: str, method: str, payload: Any = None) -> dict:
+    started = time.perf_counter()
+    try:
+        response = await local.perform_rpc(
+            destination_identity=destination,
+            method=method,
+            payload=json.dumps(payload or {}),
+            response_timeout=PRELOAD_TIMEOUT,
+        )
+        data = json.loads(response or "{}")
+    except (rtc.RpcError, ValueError) as e:
+        record_rpc(method, "error", time.perf_counter() - started)
+        logger.warning("preload %s failed: %s", method, e)
+        return {}
+    record_rpc(method, "ok", time.perf_counter() - started)
+    return data if isinstance(data, dict) and data.get("success", True) else {}
+
+
+async def load_session_context(local: rtc.LocalParticipant, participant: rtc.RemoteParticipant) -> SessionContext:
+    """Fetch user context, favorites and any continuing session concurrently."""
+    user, session, favorites = await asyncio.gather(
+        _rpc(local, participant.identity, "get_user_context"),
+        _rpc(local, participant.identity, "get_session_context"),
+        _rpc(local, participant.identity, "get_user_favorites"),
+    )
+    # The page also puts the user context in its participant metadata, which
+    # covers a failed RPC.
+    user = user or _from_metadata(participant.metadata)
+
+    return SessionContext(
+        user_name=user.get("user_name") or "",
+        preferences=user.get("preferences") or {},
+        context_summary=user.get("context_summary") or "",
+        favorites=favorites.get("favorites") or [],
+        continuation=session if session.get("is_continuation") else None,
+    )
+
+
+async def load_persistence_auth(local: rtc.LocalParticipant, participant: rtc.RemoteParticipant) -> tuple[str, str]:
+    """The signed-in user's PocketBase token and cooking session record id, or empty strings for guests."""
+    auth = await _rpc(local, participant.identity, "get_persistence_auth")
+    return auth.get("token") or "", auth.get("session_id") or ""
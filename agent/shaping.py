@@ -0,0 +1,178 @@
+import html
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("agent-Bruno")
+
+# Upper bound, in bytes, on what a tool hands back to the realtime model. List
+# results are cut from the tail (least relevant first) until they fit, and
+# then say how many items were left out.
+DEFAULT_BUDGET = int(os.getenv("MISE_TOOL_RESULT_BUDGET", "4000"))
+BUDGETS: dict[str, int] = {}
+# Dropping steps would make Bruno skip parts of the recipe, so these are
+# returned whole whatever their size.
+UNCUT = {"analyzedInstructions"}
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def strip_html(text: Optional[str]) -> str:
+    """Turn Spoonacular's HTML snippets into plain text."""
+    if not text:
+        return ""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub("", text))).strip()
+
+
+def _names(items: Optional[list]) -> list[str]:
+    return [i["name"] for i in items or [] if isinstance(i, dict) and i.get("name")]
+
+
+def _shape_find_by_ingredients(data: list) -> list[dict]:
+    return [
+        {
+            "id": r.get("id"),
+            "title": r.get("title"),
+            "image": r.get("image"),
+            "used_count": r.get("usedIngredientCount"),
+            "missed_count": r.get("missedIngredientCount"),
+            "missed": _names(r.get("missedIngredients")),
+        }
+        for r in data
+    ]
+
+
+def _shape_similar(data: list) -> list[dict]:
+    return [
+        {
+            "id": r.get("id"),
+            "title": r.get("title"),
+            "minutes": r.get("readyInMinutes"),
+            "servings": r.get("servings"),
+        }
+        for r in data
+    ]
+
+
+def _shape_summary(data: dict) -> dict:
+    return {
+        "id": data.get("id"),
+        "title": data.get("title"),
+        "summary": strip_html(data.get("summary")),
+    }
+
+
+def _shape_summaries(data: list) -> list[dict]:
+    return [_shape_summary(r) for r in data]
+
+
+def _shape_ingredient_search(data: dict) -> list[str]:
+    return _names(data.get("results"))
+
+
+def shape_instructions(data: list) -> list[dict]:
+    """Flatten analyzedInstructions sections into one numbered list of compact steps."""
+    steps = []
+    for section in data:
+        name = section.get("name") or ""
+        for step in section.get("steps") or []:
+            shaped = {
+                "number": len(steps) + 1,
+                "step": step.get("step", "").strip(),
+                "ingredients": _names(step.get("ingredients")),
+                "equipment": _names(step.get("equipment")),
+            }
+            length = step.get("length")
+            if length and length.get("number"):
+                shaped["time"] = f"{length['number']} {length.get('unit', 'minutes')}"
+            if name:
+                shaped["section"] = name
+            steps.append(shaped)
+    return steps
+
+
+SHAPERS: dict[str, Callable[[Any], Any]] = {
+    "findByIngredients": _shape_find_by_ingredients,
+    "similar": _shape_similar,
+    "summary": _shape_summary,
+    "summaries": _shape_summaries,
+    "ingredients/search": _shape_ingredient_search,
+    "analyzedInstructions": shape_instructions,
+}
+
+
+class ShapingStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.raw_bytes = 0
+        self.shaped_bytes = 0
+
+    def record(self, raw: int, shaped: int) -> None:
+        self.calls += 1
+        self.raw_bytes += raw
+        self.shaped_bytes += shaped
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "raw_bytes": self.raw_bytes,
+            "shaped_bytes": self.shaped_bytes,
+            "bytes_saved": self.raw_bytes - self.shaped_bytes,
+        }
+
+
+stats = ShapingStats()
+
+
+def _fit(shaped: Any, budget: int) -> str:
+    """Serialize ``shaped``, cutting a list from the tail to fit ``budget``.
+
+    A cut list comes back as ``{"results": [...], "truncated": n}`` so the
+    model knows there were ``n`` more items.
+    """
+    out = json.dumps(shaped, separators=(",", ":"))
+    if not isinstance(shaped, list) or len(out.encode()) <= budget:
+        return out
+    kept = len(shaped)
+    while kept > 1:
+        kept -= 1
+        out = json.dumps({"results": shaped[:kept], "truncated": len(shaped) - kept}, separators=(",", ":"))
+        if len(out.encode()) <= budget:
+            break
+    return out
+
+
+def shape(endpoint: str, body: Any) -> str:
+    """Reduce a Spoonacular response to the fields the prompt uses.
+
+    Args:
+        endpoint: The endpoint name from spoonacular.endpoint_name, or "summaries".
+        body: The raw response text, or already-decoded JSON.
+    """
+
+    raw = body if isinstance(body, str) else json.dumps(body)
+    shaper = SHAPERS.get(endpoint)
+    if shaper is None:
+        return raw
+
+    try:
+        data = json.loads(body) if isinstance(body, str) else body
+        shaped = shaper(data)
+        if endpoint in UNCUT:
+            out = json.dumps(shaped, separators=(",", ":"))
+        else:
+            out = _fit(shaped, BUDGETS.get(endpoint, DEFAULT_BUDGET))
+    except (ValueError, TypeError, AttributeError, KeyError) as e:
+        logger.warning("could not shape %s response, returning it unchanged: %s", endpoint, e)
+        return raw
+
+    raw_bytes, shaped_bytes = len(raw.encode()), len(out.encode())
+    stats.record(raw_bytes, shaped_bytes)
+    logger.debug(
+        "shaped %s result: %d -> %d bytes (%d saved)",
+        endpoint, raw_bytes, shaped_bytes, raw_bytes - shaped_bytes,
+    )
+    return out
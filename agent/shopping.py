@@ -0,0 +1,168 @@
+import logging
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import Iterable, Optional
+from recipe_index import PANTRY_STAPLES, ingredient_key, same_ingredient
+
+logger = logging.getLogger("agent-Bruno")
+
+# Unit spellings -> (canonical unit, dimension, size in the dimension's base
+# unit). Volumes are in ml and weights in g; everything else is counted as is.
+UNITS = {}
+for names, unit, dimension, size in (
+    (("tsp", "tsps", "teaspoon", "teaspoons", "t"), "teaspoon", "volume", 4.92892),
+    (("tbsp", "tbsps", "tbs", "tablespoon", "tablespoons", "T", "Tbsp"), "tablespoon", "volume", 14.7868),
+    (("cup", "cups", "c"), "cup", "volume", 236.588),
+    (("fl oz", "fluid ounce", "fluid ounces"), "fluid ounce", "volume", 29.5735),
+    (("pint", "pints", "pt"), "pint", "volume", 473.176),
+    (("quart", "quarts", "qt"), "quart", "volume", 946.353),
+    (("gallon", "gallons", "gal"), "gallon", "volume", 3785.41),
+    (("ml", "milliliter", "milliliters", "millilitre", "millilitres"), "ml", "volume", 1.0),
+    (("l", "liter", "liters", "litre", "litres"), "l", "volume", 1000.0),
+    (("g", "gram", "grams", "gr"), "g", "weight", 1.0),
+    (("kg", "kilogram", "kilograms"), "kg", "weight", 1000.0),
+    (("oz", "ounce", "ounces"), "ounce", "weight", 28.3495),
+    (("lb", "lbs", "pound", "pounds"), "pound", "weight", 453.592),
+):
+    for name in names:
+        UNITS[name] = (unit, dimension, size)
+
+_METRIC = {"ml", "l", "g", "kg"}
+# Unit words that only describe a count of the ingredient itself.
+_COUNT_WORDS = {"", "serving", "servings", "whole", "large", "medium", "small", "piece", "pieces", "each"}
+# Largest unit first, used once a total is at least its ``minimum``.
+_DISPLAY = {
+    ("volume", False): (("gallon", 3785.41, 4), ("quart", 946.353, 2), ("cup", 236.588, 0.25), ("tablespoon", 14.7868, 1), ("teaspoon", 4.92892, 0)),
+    ("volume", True): (("l", 1000.0, 1), ("ml", 1.0, 0)),
+    ("weight", False): (("pound", 453.592, 1), ("ounce", 28.3495, 0)),
+    ("weight", True): (("kg", 1000.0, 1), ("g", 1.0, 0)),
+}
+_PANTRY_KEYS = {ingredient_key(n) for n in PANTRY_STAPLES}
+
+def normalize_unit(unit: Optional[str]) -> tuple[str, str, float]:
+    """Return ``(unit, dimension, base size)``; unknown units are their own dimension."""
+    raw = (unit or "").strip().rstrip(".")
+    if raw in UNITS:
+        return UNITS[raw]
+    lowered = raw.lower()
+    if lowered in UNITS:
+        return UNITS[lowered]
+    if lowered in _COUNT_WORDS:
+        return "", "count", 1.0
+    # Cans, cloves, bunches...: counted, but only against the same unit.
+    unit = lowered[:-1] if lowered.endswith("s") and not lowered.endswith("ss") else lowered
+    return unit, f"unit:{unit}", 1.0
+
+
+def format_amount(amount: float) -> str:
+    """Spoken-friendly amount: whole numbers and common fractions, e.g. "1 1/2"."""
+    if amount >= 10:
+        return str(round(amount))
+    fraction = Fraction(round(amount * 4) / 4 if amount >= 0.25 else round(amount * 8) / 8).limit_denominator(8)
+    if fraction == 0:
+        fraction = Fraction(1, 8)
+    whole, rest = divmod(fraction, 1)
+    if not rest:
+        return str(whole)
+    return f"{whole} {rest}" if whole else str(rest)
+
+
+def _plural(unit: str, amount: float) -> str:
+    if not unit or unit in _METRIC or amount <= 1:
+        return unit
+    if unit.endswith("ch") or unit.endswith("sh"):
+        return unit + "es"
+    return unit[:-1] + "ies" if unit.endswith("y") else unit + "s"
+
+
+@dataclass
+class _Entry:
+    name: str
+    aisle: str = ""
+    # dimension -> total in base units; "volume"/"weight" also remember
+    # whether every amount came in metric.
+    totals: dict[str, float] = field(default_factory=dict)
+    units: dict[str, str] = field(default_factory=dict)
+    metric: dict[str, bool] = field(default_factory=dict)
+
+    def add(self, amount: Optional[float], unit: Optional[str]) -> None:
+        if not amount or amount <= 0:
+            return
+        canonical, dimension, size = normalize_unit(unit)
+        self.totals[dimension] = self.totals.get(dimension, 0.0) + amount * size
+        self.units[dimension] = canonical
+        self.metric[dimension] = self.metric.get(dimension, True) and canonical in _METRIC
+
+    def quantities(self) -> list[str]:
+        parts = []
+        for dimension, total in self.totals.items():
+            if dimension in ("volume", "weight"):
+                for unit, size, minimum in _DISPLAY[(dimension, self.metric[dimension])]:
+                    if total / size >= minimum:
+                        amount = total / size
+                        break
+                if unit in _METRIC:
+                    parts.append(f"{round(amount, 1):g} {unit}" if unit in ("l", "kg") else f"{round(amount):d} {unit}")
+                else:
+                    parts.append(f"{format_amount(amount)} {_plural(unit, amount)}")
+            else:
+                unit = self.units[dimension]
+                parts.append(f"{format_amount(total)} {_plural(unit, total)}".strip())
+        return parts
+
+    def __str__(self) -> str:
+        quantities = self.quantities()
+        return f"{' + '.join(quantities)} {self.name}" if quantities else self.name
+
+
+class ShoppingList:
+    """Missing ingredients for one or more recipes, merged into one list.
+
+    Ingredients are merged by normalized name; amounts are summed per
+    dimension (volume, weight, count) after converting units, so "2 tbsp"
+    and "1/4 cup" of the same thing become one line. Pantry staples and
+    anything the user already has are left out.
+    """
+
+    def __init__(self, have: Iterable[str] = ()) -> None:
+        self._have = {ingredient_key(h) for h in have if h}
+        self._entries: dict[str, _Entry] = {}
+        self.recipes: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _owned(self, key: str) -> bool:
+        """Whether ``key`` is a pantry staple or something the user has.
+
+        Keys match by recipe_index.same_ingredient: having "onion" covers
+        "red onion", but having butter doesn't cover peanut butter.
+        """
+        return key in _PANTRY_KEYS or any(same_ingredient(h, key) for h in self._have)
+
+    def add(self, name: str, amount: Optional[float] = None, unit: Optional[str] = None, aisle: Optional[str] = None) -> None:
+        key = ingredient_key(name or "")
+        if not key or self._owned(key):
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(name=name.strip().lower(), aisle=aisle or "")
+        entry.add(amount, unit)
+
+    def add_recipe(self, title: str, ingredients: Iterable[dict]) -> None:
+        """Add a recipe's ``{"name", "amount", "unit", "aisle"}`` ingredients, like missedIngredients."""
+        self.recipes.append(title)
+        for item in ingredients:
+            if isinstance(item, dict):
+                name = item.get("nameClean") or item.get("name")
+                if name:
+                    self.add(name, item.get("amount"), item.get("unit"), item.get("aisle"))
+
+    def items(self) -> list[str]:
+        """One line per ingredient, grouped by aisle when known."""
+        entries = sorted(self._entries.values(), key=lambda e: (e.aisle.lower(), e.name))
+        return [str(e) for e in entries]
+
+    @property
+    def title(self) -> str:
+        return " & ".join(self.recipes) if self.recipes else "Shopping list"
@@ -0,0 +1,197 @@
+import itertools
+import json
+import logging
+import os
+import re
+from typing import Iterable, Optional
+import numpy as np
+from recipe_index import PANTRY_STAPLES, ingredient_key, recipe_ingredients
+
+logger = logging.getLogger("agent-Bruno")
+
+# Recipes the index will hold; search results past this are not learned.
+MAX_RECIPES = int(os.getenv("MISE_SIMILARITY_MAX_RECIPES", "50000"))
+# Local answers scoring below this don't count as similar.
+MIN_SIMILARITY = float(os.getenv("MISE_SIMILARITY_MIN_SCORE", "0.15"))
+# From this many recipes on, features found in more than APPROX_MAX_DF of
+# them are skipped at query time. They carry almost no weight but have the
+# longest posting lists, so this trades a little recall for speed.
+APPROX_MIN_RECIPES = int(os.getenv("MISE_SIMILARITY_APPROX_MIN_RECIPES", "5000"))
+APPROX_MAX_DF = 0.2
+REBUILD_MIN_CHANGES = 16
+# A shared cuisine counts as much as this many shared ingredients of equal rarity.
+CUISINE_WEIGHT = 2.0
+
+# Fields kept per recipe for results and preference checks.
+_FIELDS = (
+    "id", "title", "image", "readyInMinutes", "servings", "cuisines", "diets",
+    "vegetarian", "vegan", "glutenFree", "dairyFree",
+)
+_LISTED = ("usedIngredients", "missedIngredients")
+_CACHED_RE = re.compile(r"^/recipes/(\d+)/(summary|analyzedInstructions)(\?|$)")
+_PANTRY_KEYS = {ingredient_key(n) for n in PANTRY_STAPLES}
+
+
+def _ingredient_names(recipe: dict) -> list[str]:
+    names = [i["name"] for i in recipe_ingredients(recipe)]
+    for key in _LISTED:
+        names += [i.get("nameClean") or i.get("name") for i in recipe.get(key) or [] if isinstance(i, dict)]
+    return [n for n in names if n]
+
+
+class SimilarityIndex:
+    """Recipe-to-recipe similarity over every recipe the worker has seen.
+
+    Each recipe is a sparse vector of its ingredients (pantry staples left
+    out) and cuisines, weighted by inverse document frequency so a shared
+    saffron says more than a shared onion. Similarity is the cosine between
+    vectors, computed for all recipes at once from the feature posting lists
+    with NumPy. Recipes are learned incrementally, from the corpus, stored
+    responses and search results, merging what each source knows about an
+    id. The arrays are rebuilt when a query needs a recipe added since the
+    last build, or once changes reach 1% of the index; until then queries
+    run against the previous build.
+    """
+
+    def __init__(self, max_recipes: int = MAX_RECIPES) -> None:
+        self.max_recipes = max_recipes
+        self._ids: dict[int, int] = {}
+        self._meta: list[dict] = []
+        self._features: list[list[int]] = []
+        self._vocab: dict[str, int] = {}
+        self._boost: list[float] = []
+        self._built = 0
+        self._pending = 0
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def get(self, recipe_id: int) -> Optional[dict]:
+        row = self._ids.get(recipe_id)
+        return self._meta[row] if row is not None else None
+
+    def _column(self, feature: str, boost: float) -> int:
+        col = self._vocab.get(feature)
+        if col is None:
+            col = self._vocab[feature] = len(self._vocab)
+            self._boost.append(boost)
+        return col
+
+    def add(self, recipe: dict) -> bool:
+        """Learn a Spoonacular-shaped recipe or search result; True if anything was new."""
+        try:
+            recipe_id = int(recipe.get("id"))
+        except (TypeError, ValueError):
+            return False
+        row = self._ids.get(recipe_id)
+        if row is None:
+            if len(self._meta) >= self.max_recipes:
+                return False
+            row = self._ids[recipe_id] = len(self._meta)
+            self._meta.append({"id": recipe_id, "ingredients": []})
+            self._features.append([])
+            changed = True
+        else:
+            changed = False
+
+        meta, features = self._meta[row], self._features[row]
+        for field in _FIELDS[1:]:
+            if recipe.get(field) not in (None, "", []) and field not in meta:
+                meta[field] = recipe[field]
+        for name in _ingredient_names(recipe):
+            key = ingredient_key(name)
+            if not key or key in _PANTRY_KEYS:
+                continue
+            col = self._column(key, 1.0)
+            if col not in features:
+                features.append(col)
+                meta["ingredients"].append(name)
+                changed = True
+        for cuisine in recipe.get("cuisines") or []:
+            col = self._column(f"cuisine:{str(cuisine).lower()}", CUISINE_WEIGHT)
+            if col not in features:
+                features.append(col)
+                changed = True
+
+        self._pending += changed
+        return changed
+
+    def add_many(self, recipes: Iterable[dict]) -> int:
+        return sum(self.add(r) for r in recipes if isinstance(r, dict))
+
+    def learn_from_cache(self, entries: Iterable[tuple[str, str]]) -> int:
+        """Learn recipes from stored ``(cache key, body)`` summary and analyzedInstructions responses."""
+        recipes: dict[int, dict] = {}
+        for key, body in entries:
+            match = _CACHED_RE.match(key)
+            if not match:
+                continue
+            try:
+                data = json.loads(body)
+            except ValueError:
+                continue
+            recipe = recipes.setdefault(int(match.group(1)), {"id": int(match.group(1)), "ingredients": []})
+            if match.group(2) == "summary" and isinstance(data, dict):
+                recipe["title"] = data.get("title")
+            elif isinstance(data, list):
+                recipe["ingredients"] += [
+                    i for section in data if isinstance(section, dict)
+                    for step in section.get("steps") or [] for i in step.get("ingredients") or []
+                ]
+        return self.add_many(recipes.values())
+
+    def _build(self) -> None:
+        n = len(self._meta)
+        lengths = np.fromiter((len(f) for f in self._features), dtype=np.int64, count=n)
+        cols = np.fromiter(itertools.chain.from_iterable(self._features), dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        self._df = np.bincount(cols, minlength=len(self._vocab))
+        # Smoothed idf, so a feature every recipe has still counts a little.
+        self._weights = (np.log((1 + n) / (1 + self._df)) + 1) * np.asarray(self._boost)
+        self._norms = np.sqrt(np.bincount(rows, weights=self._weights[cols] ** 2, minlength=n))
+        order = np.argsort(cols, kind="stable")
+        self._posting_rows = rows[order]
+        self._posting_starts = np.concatenate(([0], np.cumsum(self._df)))
+        self._built, self._pending = n, 0
+
+    def similar(self, recipe_id: int, number: int = 10, min_score: float = MIN_SIMILARITY) -> list[tuple[dict, float]]:
+        """The ``number`` recipes most similar to ``recipe_id``, best first, with their scores."""
+        row = self._ids.get(recipe_id)
+        if row is None or not self._features[row]:
+            return []
+        if row >= self._built or self._pending > max(REBUILD_MIN_CHANGES, self._built // 100):
+            self._build()
+
+        n = self._built
+        query = np.asarray(self._features[row], dtype=np.int64)
+        # Ingredients learned since the build aren't in its arrays yet.
+        query = query[query < len(self._df)]
+        if n >= APPROX_MIN_RECIPES:
+            common = self._df[query] > APPROX_MAX_DF * n
+            if not common.all():
+                query = query[~common]
+        if not len(query):
+            return []
+        starts, ends = self._posting_starts[query], self._posting_starts[query + 1]
+        hits = np.concatenate([self._posting_rows[s:e] for s, e in zip(starts, ends)])
+        weights = np.repeat(self._weights[query] ** 2, ends - starts)
+        scores = np.bincount(hits, weights=weights, minlength=n) / (self._norms * self._norms[row] + 1e-12)
+        scores[row] = 0.0
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > number:
+            candidates = candidates[np.argpartition(-scores[candidates], number - 1)[:number]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self._meta[r], float(scores[r])) for r in candidates]
+
+
+_similarity_index: Optional[SimilarityIndex] = None
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """Return the process-wide similarity index."""
+    global _similarity_index
+    if _similarity_index is None:
+        _similarity_index = SimilarityIndex()
+    return _similarity_index
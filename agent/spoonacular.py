@@ -0,0 +1,482 @@
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import quote, urlencode
+import aiohttp
+import asyncio
+import json
+from livekit.agents import ToolError, utils
+from instrumentation import record_lookup, record_upstream, upstream_request
+from recipe_store import RECIPE_STORE_PATH, RecipeStore
+from traffic import body_fields, trace_event
+
+logger = logging.getLogger("agent-Bruno")
+
+SPOONACULAR_BASE_URL = os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com")
+SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY", "264361e4b8084bd992ed7128e8955736")
+
+# How long a cached response stays fresh, per endpoint. Recipe ids are stable,
+# so their instructions/summaries/similar lists can be kept much longer than
+# free-text searches.
+ENDPOINT_TTLS = {
+    "analyzedInstructions": 24 * 3600.0,
+    "summary": 24 * 3600.0,
+    "similar": 24 * 3600.0,
+    "findByIngredients": 3600.0,
+    "complexSearch": 3600.0,
+    "informationBulk": 24 * 3600.0,
+    "ingredients/search": 6 * 3600.0,
+}
+DEFAULT_TTL = 3600.0
+
+# Per-endpoint request timeouts, in seconds. A slow upstream should cost a
+# voice turn a few seconds at most, not the old flat ten.
+ENDPOINT_TIMEOUTS = {
+    "analyzedInstructions": 4.0,
+    "summary": 3.0,
+    "similar": 3.0,
+    "findByIngredients": 5.0,
+    "complexSearch": 5.0,
+    "informationBulk": 5.0,
+    "ingredients/search": 3.0,
+}
+DEFAULT_TIMEOUT = 4.0
+
+MAX_RETRIES = int(os.getenv("SPOONACULAR_MAX_RETRIES", "2"))
+RETRY_BACKOFF_BASE = 0.2
+RETRY_BACKOFF_CAP = 1.5
+# A call, retries and backoff included, gets this many times its endpoint
+# timeout in total. A timed-out attempt has used its budget and isn't retried.
+DEADLINE_FACTOR = 1.5
+# No retry starts with less than this left before the deadline.
+MIN_ATTEMPT_TIME = 0.5
+
+
+def endpoint_name(path: str) -> str:
+    """Map a request path like "/recipes/123/summary" to its endpoint name."""
+    parts = [p for p in path.strip("/").split("/") if p]
+    if parts[:2] == ["food", "ingredients"]:
+        return "/".join(parts[1:])
+    return parts[-1] if parts else ""
+
+
+def normalize_params(params: Optional[dict]) -> dict:
+    """Normalize query params so equivalent requests share a cache key.
+
+    Strings are trimmed and lowercased, comma-separated lists are de-duplicated
+    and sorted, and empty values are dropped.
+    """
+    normalized = {}
+    for key, value in (params or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, str):
+            items = [v.strip().lower() for v in value.split(",")]
+            items = sorted({v for v in items if v})
+            if not items:
+                continue
+            value = ",".join(items)
+        normalized[key] = str(value)
+    return dict(sorted(normalized.items()))
+
+
+def cache_key(path: str, params: Optional[dict] = None) -> str:
+    query = urlencode(normalize_params(params))
+    return f"{path}?{query}" if query else path
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+class ResponseCache:
+    """In-memory LRU cache of response bodies with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 2048) -> None:
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            # Expired entries stay around (until LRU eviction) so they can be
+            # served stale while the upstream is down.
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def get_stale(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: str, value: str, ttl: float = DEFAULT_TTL) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class UpstreamError(ToolError):
+    """Spoonacular is unreachable, failing or out of quota (as opposed to a bad request)."""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, then lets one probe through after a cooldown."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """Let another request probe when this one ended without a verdict, e.g. was cancelled."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning("spoonacular circuit opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class SpoonacularClient:
+    """Thin Spoonacular client shared by every tool and session in a worker process."""
+
+    def __init__(
+        self,
+        api_key: str = SPOONACULAR_API_KEY,
+        base_url: str = SPOONACULAR_BASE_URL,
+        cache: Optional[ResponseCache] = None,
+        store: Optional[RecipeStore] = None,
+        http_session: Optional[aiohttp.ClientSession] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = MAX_RETRIES,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache if cache is not None else ResponseCache(
+            max_entries=int(os.getenv("SPOONACULAR_CACHE_SIZE", "2048"))
+        )
+        self.store = store
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_retries = max_retries
+        self._http_session = http_session
+        # Single-flight: concurrent misses for the same key share one request.
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self.retries = 0
+        self.rejected = 0
+        self.stale_served = 0
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http_session is not None:
+            return self._http_session
+        return utils.http_context.http_session()
+
+    def stats(self) -> dict:
+        stats = {
+            "cache": self.cache.stats.as_dict(),
+            "cache_entries": len(self.cache),
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "circuit": self.breaker.state,
+            "circuit_rejected": self.rejected,
+            "stale_served": self.stale_served,
+        }
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        return stats
+
+    def warm(self, limit: int = 1000) -> int:
+        """Load the most recently used persisted responses into the memory cache."""
+        if self.store is None:
+            return 0
+        rows = self.store.recent(limit)
+        for key, body, ttl in reversed(rows):
+            self.cache.set(key, body, ttl)
+        return len(rows)
+
+    async def preconnect(self) -> None:
+        """Open a keep-alive connection ahead of the first tool call.
+
+        Sends an unauthenticated HEAD so no quota is used; the response
+        itself is ignored.
+        """
+        try:
+            async with self._session().head(self.base_url, timeout=aiohttp.ClientTimeout(total=3.0)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug("spoonacular preconnect failed: %s", e)
+
+    async def get(self, path: str, params: Optional[dict] = None) -> str:
+        """GET a Spoonacular endpoint, answering from the cache when possible.
+
+        Args:
+            path: The endpoint path, e.g. "/recipes/123/summary".
+            params: Query parameters, excluding the API key.
+        """
+
+        key = cache_key(path, params)
+        endpoint = endpoint_name(path)
+        cached = self._lookup(key, endpoint)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            record_lookup(endpoint, "coalesced")
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(self._fetch(path, params, key, endpoint))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish_inflight(key, t))
+        return await asyncio.shield(task)
+
+    def peek(self, path: str, params: Optional[dict] = None) -> Optional[str]:
+        """Return a cached response for a GET without going upstream, or None."""
+        return self._lookup(cache_key(path, params), endpoint_name(path))
+
+    def _finish_inflight(self, key: str, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        # Retrieve the exception so it isn't reported as unhandled when every
+        # waiter was cancelled before the request finished.
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, path: str, params: Optional[dict], key: str, endpoint: str) -> str:
+        if not self.breaker.allow():
+            self.rejected += 1
+            return self._serve_stale(key, UpstreamError("error: the recipe service is temporarily unavailable"))
+
+        try:
+            body = await self._request(path, params, endpoint)
+        except UpstreamError as e:
+            self.breaker.record_failure()
+            return self._serve_stale(key, e)
+        except ToolError:
+            # A 4xx for this request says nothing about upstream health.
+            self.breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            # Anything unexpected (an undecodable body, say) still counts
+            # against upstream, and never leaves a half-open probe held.
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        self._remember(key, endpoint, body)
+        record_lookup(endpoint, "upstream")
+        return body
+
+    async def _request(self, path: str, params: Optional[dict], endpoint: str) -> str:
+        """Send the GET, retrying connection errors, 429s and 5xxs with full-jitter backoff.
+
+        Every attempt's timeout is cut to what is left of the call's deadline,
+        so a slow upstream costs a turn at most DEADLINE_FACTOR times the
+        endpoint timeout.
+        """
+        query = normalize_params(params)
+        query["apiKey"] = self.api_key
+        limit = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        deadline = time.monotonic() + limit * DEADLINE_FACTOR
+
+        error: ToolError = UpstreamError("error: request not sent")
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                backoff = random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** attempt))
+                if deadline - time.monotonic() - backoff < MIN_ATTEMPT_TIME:
+                    break
+                self.retries += 1
+                await asyncio.sleep(backoff)
+            timeout = aiohttp.ClientTimeout(total=min(limit, deadline - time.monotonic()))
+            started = time.perf_counter()
+            try:
+                with upstream_request("spoonacular"):
+                    async with self._session().get(
+                        f"{self.base_url}{path}", timeout=timeout, params=query
+                    ) as resp:
+                        body = await resp.text()
+                        status = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                record_upstream("spoonacular", endpoint, "error", time.perf_counter() - started)
+                trace_event("upstream", service="spoonacular", path=path, params=normalize_params(params),
+                            status="error", ms=round((time.perf_counter() - started) * 1000, 1))
+                if isinstance(e, asyncio.TimeoutError):
+                    raise UpstreamError(f"error: {endpoint} timed out after {time.perf_counter() - started:.1f}s") from e
+                error = UpstreamError(f"error: {e!s}")
+                continue
+            record_upstream("spoonacular", endpoint, status, time.perf_counter() - started)
+            trace_event("upstream", service="spoonacular", path=path, params=normalize_params(params),
+                        status=status, ms=round((time.perf_counter() - started) * 1000, 1), **body_fields(body))
+
+            if status < 400:
+                return body
+            if status == 402:
+                # Daily quota is used up; retrying won't help until it resets.
+                raise UpstreamError(f"error: HTTP {status}: {body}")
+            if status == 429 or status >= 500:
+                error = UpstreamError(f"error: HTTP {status}: {body}")
+                continue
+            raise ToolError(f"error: HTTP {status}: {body}")
+
+        raise error
+
+    def _serve_stale(self, key: str, error: ToolError) -> str:
+        stale = self.cache.get_stale(key)
+        if stale is None and self.store is not None:
+            stale = self.store.get_stale(key)
+        if stale is None:
+            raise error
+        self.stale_served += 1
+        record_lookup(endpoint_name(key.split("?", 1)[0]), "stale")
+        logger.info("serving stale response for %s: %s", key, error)
+        return stale
+
+    def _lookup(self, key: str, endpoint: str) -> Optional[str]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            record_lookup(endpoint, "memory")
+            return cached
+        if self.store is not None and self.store.persists(endpoint):
+            stored = self.store.get(key)
+            if stored is not None:
+                body, ttl = stored
+                self.cache.set(key, body, min(ttl, ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)))
+                record_lookup(endpoint, "store")
+                return body
+        return None
+
+    def _remember(self, key: str, endpoint: str, body: str) -> None:
+        self.cache.set(key, body, ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL))
+        if self.store is not None:
+            self.store.set(key, endpoint, body)
+
+    async def get_summaries(self, ids: list[str]) -> list[dict]:
+        """Summaries for several recipes, shaped like the /recipes/{id}/summary response.
+
+        Cached summaries are reused; the rest are fetched with a single
+        /recipes/informationBulk request and written back to the per-id cache so
+        later summarize_recipe calls hit too. If the bulk request fails, the
+        missing ids are fetched concurrently from the per-id endpoint instead.
+        Recipes that could not be fetched are left out.
+        """
+        summaries: dict[str, dict] = {}
+        missing = []
+        for id_ in dict.fromkeys(ids):
+            path = f"/recipes/{quote(id_, safe='')}/summary"
+            cached = self._lookup(cache_key(path), "summary")
+            if cached is not None:
+                summaries[id_] = json.loads(cached)
+            else:
+                missing.append(id_)
+
+        if missing:
+            try:
+                body = await self.get(
+                    "/recipes/informationBulk",
+                    {"ids": ",".join(missing), "includeNutrition": False},
+                )
+                for info in json.loads(body):
+                    id_ = str(info.get("id"))
+                    summary = {
+                        "id": info.get("id"),
+                        "title": info.get("title"),
+                        "summary": info.get("summary") or "",
+                    }
+                    path = f"/recipes/{quote(id_, safe='')}/summary"
+                    self._remember(cache_key(path), "summary", json.dumps(summary))
+                    summaries[id_] = summary
+            except (ToolError, ValueError, AttributeError) as e:
+                logger.warning("informationBulk failed, fetching summaries one by one: %s", e)
+                results = await asyncio.gather(
+                    *(self.get(f"/recipes/{quote(id_, safe='')}/summary") for id_ in missing),
+                    return_exceptions=True,
+                )
+                for id_, result in zip(missing, results):
+                    if isinstance(result, str):
+                        try:
+                            summaries[id_] = json.loads(result)
+                        except ValueError:
+                            continue
+
+        return [summaries[id_] for id_ in dict.fromkeys(ids) if id_ in summaries]
+
+
+_client: Optional[SpoonacularClient] = None
+
+
+def get_client() -> SpoonacularClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        store = None
+        if RECIPE_STORE_PATH:
+            try:
+                store = RecipeStore(RECIPE_STORE_PATH)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("recipe store unavailable, using memory cache only: %s", e)
+        _client = SpoonacularClient(store=store)
+    return _client
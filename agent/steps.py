@@ -0,0 +1,49 @@
+from typing import Any, Optional
+from shaping import shape_instructions
+
+
+class RecipeSteps:
+    """Compact, numbered steps of one recipe, parsed once per selection.
+
+    Step tools hand the model a single step at a time from here instead of
+    relying on it to remember the whole instructions payload.
+    """
+
+    def __init__(self, recipe_id: Optional[int], steps: list[dict]) -> None:
+        self.recipe_id = recipe_id
+        self.steps = steps
+        # Step the user is on, 1-indexed; 0 until the first step is read out.
+        self.current = 0
+
+    @classmethod
+    def from_instructions(cls, recipe_id: Optional[int], data: Any) -> "RecipeSteps":
+        """Build from a raw analyzedInstructions response or an already shaped step list."""
+        if not isinstance(data, list):
+            data = []
+        if any(isinstance(item, dict) and "steps" in item for item in data):
+            data = shape_instructions(data)
+        return cls(recipe_id, [s for s in data if isinstance(s, dict) and s.get("step")])
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def step(self, number: int) -> dict:
+        """Return step ``number`` (1-indexed) with its position in the recipe."""
+        step = dict(self.steps[number - 1])
+        step["number"] = number
+        step["total_steps"] = len(self.steps)
+        step["is_last"] = number == len(self.steps)
+        return step
+
+    def overview(self) -> dict:
+        equipment, ingredients = [], []
+        for step in self.steps:
+            equipment += [e for e in step.get("equipment", []) if e not in equipment]
+            ingredients += [i for i in step.get("ingredients", []) if i not in ingredients]
+        return {
+            "recipe_id": self.recipe_id,
+            "total_steps": len(self.steps),
+            "equipment": equipment,
+            "ingredients": ingredients,
+            "timed_steps": [s["number"] for s in self.steps if s.get("time")],
+        }
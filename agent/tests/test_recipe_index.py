@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recipe_index import RecipeIndex, same_ingredient  # noqa: E402
+from shopping import ShoppingList  # noqa: E402
+
+RECIPES = [
+    {"id": 1, "title": "Peanut Noodles", "extendedIngredients": [
+        {"name": "peanut butter"}, {"name": "rice vinegar"}, {"name": "noodles"},
+    ]},
+    {"id": 2, "title": "Butter Rice", "extendedIngredients": [
+        {"name": "butter"}, {"name": "white rice"}, {"name": "parsley"},
+    ]},
+]
+
+
+def test_same_ingredient_ignores_compound_nouns():
+    assert same_ingredient("onion", "red onion")
+    assert same_ingredient("red onion", "onion")
+    assert not same_ingredient("butter", "peanut butter")
+    assert not same_ingredient("rice", "rice vinegar")
+    assert not same_ingredient("red onion", "green onion")
+
+
+def test_compound_ingredients_are_missed_not_used():
+    results = {r["id"]: r for r in RecipeIndex(RECIPES).find_by_ingredients(["butter", "rice"])}
+
+    assert 1 not in results
+    assert results[2]["usedIngredientCount"] == 2
+    assert [i["name"] for i in results[2]["usedIngredients"]] == ["butter", "white rice"]
+    assert [i["name"] for i in results[2]["missedIngredients"]] == ["parsley"]
+
+
+def test_counts_match_lists():
+    index = RecipeIndex(RECIPES)
+    for result in index.find_by_ingredients(["peanut butter", "noodles"]):
+        assert result["usedIngredientCount"] == len(result["usedIngredients"])
+        assert result["missedIngredientCount"] == len(result["missedIngredients"])
+
+
+def test_shopping_list_keeps_compound_ingredients():
+    shopping = ShoppingList(have=["butter", "rice", "onion"])
+    for name in ("peanut butter", "rice vinegar", "red onion", "unsalted butter"):
+        shopping.add(name, 1, "cup")
+    assert shopping.items() == ["1 cup peanut butter", "1 cup rice vinegar"]
@@ -0,0 +1,115 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+logger = logging.getLogger("agent-Bruno")
+
+# Opt-in: with a directory set, every session writes a JSONL trace of its tool
+# calls, upstream responses and client writes there, for replay.py.
+TRACE_DIR = os.getenv("MISE_TRACE_DIR", "")
+TRACE_VERSION = 1
+
+# Values under these keys never reach a trace.
+REDACTED_KEYS = {
+    "apikey", "token", "password", "authorization", "email", "identity",
+    "user", "user_id", "user_name", "notes",
+}
+REDACTED = "[redacted]"
+
+_trace: contextvars.ContextVar[Optional["TraceRecorder"]] = contextvars.ContextVar("mise_trace", default=None)
+
+
+def redact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in REDACTED_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def digest(text: Optional[str]) -> Optional[str]:
+    """Short fingerprint of a tool result, to spot changed results on replay."""
+    return hashlib.sha1(text.encode()).hexdigest()[:12] if isinstance(text, str) else None
+
+
+def body_fields(body: str) -> dict:
+    """A response body as JSON when it parses, which stores far smaller than an escaped string."""
+    try:
+        return {"json": json.loads(body)}
+    except ValueError:
+        return {"text": body}
+
+
+class TraceRecorder:
+    """Append-only JSONL trace of one session's tool traffic.
+
+    Each line is one event with ``t``, seconds since the session started:
+    ``call`` and ``result`` for tool calls, ``upstream`` for Spoonacular
+    responses and ``rpc`` for client writes. Secrets and user identity are
+    redacted before anything is written.
+    """
+
+    def __init__(self, path: str, job_id: str = "") -> None:
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._started = time.monotonic()
+        self.events = 0
+        self._write({
+            "ev": "session",
+            "version": TRACE_VERSION,
+            "job": job_id,
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+
+    @classmethod
+    def for_job(cls, job_id: str) -> Optional["TraceRecorder"]:
+        """A recorder for the job when tracing is on, else None."""
+        if not TRACE_DIR:
+            return None
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            return cls(os.path.join(TRACE_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', job_id)}.jsonl"), job_id)
+        except OSError as e:
+            logger.warning("could not start a traffic trace: %s", e)
+            return None
+
+    def event(self, ev: str, **fields) -> None:
+        self._write({"t": round(time.monotonic() - self._started, 4), "ev": ev, **redact(fields)})
+
+    def _write(self, event: dict) -> None:
+        if self._file.closed:
+            return
+        self._file.write(json.dumps(event, separators=(",", ":"), default=str) + "\n")
+        self.events += 1
+
+    @contextlib.contextmanager
+    def active(self):
+        """Route trace_event calls made inside the block, and tasks it starts, to this trace."""
+        token = _trace.set(self)
+        try:
+            yield self
+        finally:
+            _trace.reset(token)
+
+    async def aclose(self) -> None:
+        self._file.close()
+        logger.info("traffic trace written to %s (%d events)", self.path, self.events)
+
+
+def trace_event(ev: str, **fields) -> None:
+    """Add an event to the trace of the tool call in progress, if it is being traced."""
+    recorder = _trace.get()
+    if recorder is not None:
+        recorder.event(ev, **fields)
+
+
+def read_trace(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,112 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+from livekit.agents import AgentSession, ConversationItemAddedEvent
+from pocketbase_client import SessionPersistence
+
+logger = logging.getLogger("agent-Bruno")
+
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("MISE_TRANSCRIPT_FLUSH_INTERVAL", "5"))
+TRANSCRIPT_FLUSH_TURNS = int(os.getenv("MISE_TRANSCRIPT_FLUSH_TURNS", "8"))
+
+
+def _timestamp(created_at: Optional[float]) -> str:
+    moment = datetime.fromtimestamp(created_at or time.time(), tz=timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class TranscriptRecorder:
+    """Append-only transcript log for one session.
+
+    Turns are buffered and written to PocketBase as numbered chunks, so each
+    turn is sent once instead of the whole transcript being rewritten on
+    every update. On close the full transcript is stored on the
+    cooking_sessions record once, for the pages that read it from there.
+    """
+
+    def __init__(
+        self,
+        persistence: SessionPersistence,
+        job_id: str,
+        flush_interval: float = TRANSCRIPT_FLUSH_INTERVAL,
+        flush_turns: int = TRANSCRIPT_FLUSH_TURNS,
+    ) -> None:
+        self.persistence = persistence
+        self.job_id = job_id
+        self.flush_interval = flush_interval
+        self.flush_turns = flush_turns
+        self.turns: list[dict] = []
+        self._flushed = 0
+        self._seq = 0
+        self._lock = asyncio.Lock()
+        self._due = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.chunks = 0
+        self.bytes = 0
+        self.failed = 0
+
+    def continue_from(self, previous: list[dict]) -> None:
+        """Prepend an earlier run's transcript; it is already stored, so it isn't re-sent as chunks."""
+        previous = [t for t in previous or [] if isinstance(t, dict)]
+        self.turns[:0] = previous
+        self._flushed += len(previous)
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("conversation_item_added", self._on_item_added)
+        self._task = asyncio.create_task(self._run())
+
+    def _on_item_added(self, ev: ConversationItemAddedEvent) -> None:
+        item = ev.item
+        if getattr(item, "type", None) != "message" or item.role not in ("user", "assistant"):
+            return
+        text = (item.text_content or "").strip()
+        if text:
+            self.append(item.role, text, getattr(item, "created_at", None))
+
+    def append(self, role: str, content: str, created_at: Optional[float] = None) -> None:
+        self.turns.append({"role": role, "content": content, "timestamp": _timestamp(created_at)})
+        if len(self.turns) - self._flushed >= self.flush_turns:
+            self._due.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._due.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._due.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            chunk = self.turns[self._flushed:]
+            if not chunk:
+                return
+            # A failed chunk is retried with the same sequence number, which
+            # maps to the same record id, so it is never stored twice.
+            if await self.persistence.append_transcript(self.job_id, self._seq, chunk):
+                self._flushed += len(chunk)
+                self._seq += 1
+                self.chunks += 1
+                self.bytes += sum(len(t["content"]) for t in chunk)
+            else:
+                self.failed += 1
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+        if self.turns and not await self.persistence.write_transcript(self.turns):
+            logger.warning("could not store the final transcript (%d turns)", len(self.turns))
+
+    def stats(self) -> dict:
+        return {
+            "turns": len(self.turns),
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "failed": self.failed,
+            "pending": len(self.turns) - self._flushed,
+        }
@@ -0,0 +1,234 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Optional
+import asyncio
+import psutil
+from livekit.agents import AgentServer
+from livekit.agents.worker import ServerEnvOption
+from instrumentation import upstream_in_flight
+
+logger = logging.getLogger("agent-Bruno")
+
+# The worker stops taking rooms once any of these is reached. The reported
+# load is the most loaded of them, scaled so that reaching a limit reports
+# exactly MISE_LOAD_THRESHOLD.
+LOAD_THRESHOLD = float(os.getenv("MISE_LOAD_THRESHOLD", "0.7"))
+MAX_SESSIONS = int(os.getenv("MISE_MAX_SESSIONS", "8"))
+MAX_LOOP_LAG = float(os.getenv("MISE_MAX_LOOP_LAG_MS", "150")) / 1000
+MAX_UPSTREAM_IN_FLIGHT = int(os.getenv("MISE_MAX_UPSTREAM_IN_FLIGHT", "48"))
+# Share of all cores used by the worker and its job processes.
+MAX_CPU = float(os.getenv("MISE_MAX_CPU", "0.8"))
+# Defaults to 80% of the host's memory.
+MAX_RSS_MB = float(os.getenv("MISE_MAX_RSS_MB", "0")) or psutil.virtual_memory().total * 0.8 / 2**20
+
+# Job processes write their event-loop lag and in-flight upstream requests
+# here, one file per process, for the load function in the main process.
+LOAD_DIR = os.getenv("MISE_LOAD_DIR", os.path.join(os.path.dirname(__file__), ".cache", "load"))
+REPORT_INTERVAL = 1.0
+# A report older than this means the process's event loop is stuck.
+REPORT_MAX_AGE = 5 * REPORT_INTERVAL
+
+
+class JobLoadReporter:
+    """Measures this process's event-loop lag and publishes it for the worker.
+
+    Lag is how late a short sleep wakes up; the worst of each interval is
+    reported. Every wakeup also stamps ``beat``, the heartbeat the loop
+    watchdog in diagnostics reads. Shared by every job in the process and
+    stopped with the last.
+    """
+
+    _instance: Optional["JobLoadReporter"] = None
+
+    def __init__(self, directory: str = LOAD_DIR, interval: float = REPORT_INTERVAL, samples: int = 10) -> None:
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+        self.interval = interval
+        self.samples = samples
+        self.step = interval / samples
+        self.beat = time.monotonic()
+        self.loop_lag = 0.0
+        self._jobs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def acquire(cls) -> "JobLoadReporter":
+        if cls._instance is None:
+            cls._instance = cls()
+        reporter = cls._instance
+        reporter._jobs += 1
+        if reporter._task is None:
+            reporter._task = asyncio.create_task(reporter._run())
+        return reporter
+
+    async def release(self) -> None:
+        self._jobs -= 1
+        if self._jobs > 0 or self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    async def _run(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        loop = asyncio.get_running_loop()
+        step = self.step
+        while True:
+            lag = 0.0
+            for _ in range(self.samples):
+                started = loop.time()
+                await asyncio.sleep(step)
+                self.beat = time.monotonic()
+                lag = max(lag, loop.time() - started - step)
+            self.loop_lag = lag
+            self._write({
+                "ts": time.time(),
+                "jobs": self._jobs,
+                "loop_lag": round(lag, 4),
+                "upstream_in_flight": upstream_in_flight(),
+            })
+
+    def _write(self, report: dict) -> None:
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(report, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug("could not write load report: %s", e)
+
+
+def _stale(pid: int, ts: float) -> bool:
+    """Whether a report written at ``ts`` can't be from the process now holding ``pid``."""
+    try:
+        return psutil.Process(pid).create_time() > ts
+    except psutil.Error:
+        return True
+
+
+def clear_stale_reports(directory: str = LOAD_DIR) -> int:
+    """Delete reports left by killed job processes; returns how many were removed.
+
+    The directory can be shared by several workers on a host, so only
+    reports whose process is gone, or whose pid now belongs to a process
+    started after the report was written, are removed.
+    """
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        pid = name.split(".", 1)[0]
+        path = os.path.join(directory, name)
+        try:
+            if not pid.isdigit() or _stale(int(pid), os.path.getmtime(path)):
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info("removed %d stale load reports from %s", removed, directory)
+    return removed
+
+
+class WorkerLoad:
+    """``load_fnc`` for the AgentServer.
+
+    Combines active sessions, the job processes' event-loop lag and in-flight
+    upstream requests, and CPU/RSS of the worker's process tree. The
+    dispatcher sends new rooms to workers reporting less load, and this worker
+    stops being offered rooms once the load reaches the threshold.
+    """
+
+    def __init__(self, threshold: float = LOAD_THRESHOLD, directory: str = LOAD_DIR) -> None:
+        self.threshold = threshold
+        self.directory = directory
+        self.limits = {
+            "sessions": MAX_SESSIONS,
+            "loop_lag": MAX_LOOP_LAG,
+            "upstream_in_flight": MAX_UPSTREAM_IN_FLIGHT,
+            "cpu": MAX_CPU,
+            "rss_mb": MAX_RSS_MB,
+        }
+        self.last: dict = {}
+        self._procs: dict[int, psutil.Process] = {}
+        self._full = False
+        # The server also refreshes load before accepting a job, so calls can overlap.
+        self._lock = threading.Lock()
+        clear_stale_reports(directory)
+
+    def server_threshold(self) -> ServerEnvOption:
+        """The AgentServer load_threshold: ours in production, none in dev mode."""
+        return ServerEnvOption(dev_default=math.inf, prod_default=self.threshold)
+
+    def __call__(self, server: AgentServer) -> float:
+        with self._lock:
+            cpu, rss_mb = self._usage()
+            reports = self._reports()
+            values = {
+                "sessions": len(server.active_jobs),
+                "loop_lag": max((r.get("loop_lag", 0.0) for r in reports), default=0.0),
+                "upstream_in_flight": sum(r.get("upstream_in_flight", 0) for r in reports),
+                "cpu": cpu,
+                "rss_mb": rss_mb,
+            }
+            ratios = {k: v / self.limits[k] for k, v in values.items() if self.limits[k] > 0}
+            busiest = max(ratios, key=ratios.get)
+            load = min(1.0, self.threshold * ratios[busiest])
+            self.last = {**values, "load": load, "busiest": busiest}
+
+            full = load >= self.threshold
+            if full != self._full:
+                self._full = full
+                logger.info(
+                    "worker %s new rooms: %s at %.3g of %.3g",
+                    "stopped taking" if full else "taking", busiest, values[busiest], self.limits[busiest],
+                    extra={"load": round(load, 3), **{k: round(v, 3) for k, v in values.items()}},
+                )
+            return load
+
+    def _usage(self) -> tuple[float, float]:
+        """CPU, as a share of all cores, and RSS in MB of this process and its children."""
+        root = psutil.Process()
+        try:
+            procs = [root, *root.children(recursive=True)]
+        except psutil.Error:
+            procs = [root]
+        live, cpu, rss = {}, 0.0, 0
+        for proc in procs:
+            # cpu_percent measures since the previous call on the same object.
+            proc = self._procs.get(proc.pid, proc)
+            try:
+                cpu += proc.cpu_percent(None)
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                continue
+            live[proc.pid] = proc
+        self._procs = live
+        return cpu / (100 * (psutil.cpu_count() or 1)), rss / 2**20
+
+    def _reports(self) -> list[dict]:
+        """Load reports from this worker's job processes; other workers on the host are skipped."""
+        reports, now = [], time.time()
+        for pid, proc in self._procs.items():
+            path = os.path.join(self.directory, f"{pid}.json")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    report = json.load(f)
+                # Left by a killed process whose pid was reused; the new
+                # process replaces it with its first report.
+                if proc.create_time() > report.get("ts", 0):
+                    continue
+            except (OSError, ValueError, psutil.Error):
+                continue
+            age = now - report.get("ts", 0)
+            # A live process that stopped reporting has a blocked loop.
+            reports.append(report if age <= REPORT_MAX_AGE else {"loop_lag": age})
+        return reports